@@ -1,14 +1,135 @@
+import argparse
+import shutil
+
 import pandas as pd
 
-# Load the CSV file
-data = pd.read_csv('BRFSS_data.csv')
+from brfss_io import (CATEGORY_COLUMNS, PARTITION_DIR, RAW_CSV, CleanedWriter, load_cleaned, partition_years,
+                      save_cleaned, write_partitions)
+from brfss_metrics import stage
+from brfss_store import INDEX_COLUMNS, STORE_DIR, BRFSSStore
+from brfss_cellstats import STATISTICS_KEYS, combine_statistics, save_statistics, year_statistics
+
+# Command-line options: by default the whole file is cleaned in memory,
+# --chunksize switches to a streaming mode whose peak memory is bounded by the chunk size
+parser = argparse.ArgumentParser(description='Drop BRFSS rows with a missing Data_Value.')
+parser.add_argument('--chunksize', type=int, default=None,
+                    help='Clean the file in streaming mode, reading this many rows at a time')
+parser.add_argument('--columns', nargs='+', default=None,
+                    help='Only keep these columns in the cleaned output')
+parser.add_argument('--filter', nargs='+', default=[], metavar='COLUMN=VALUE',
+                    help='Only keep rows where COLUMN equals VALUE, e.g. "Class=Obesity / Weight Status"')
+parser.add_argument('--append', action='store_true',
+                    help='Add the survey years of the raw file that were not ingested yet to the existing outputs')
+args = parser.parse_args()
+
+filters = dict(item.split('=', 1) for item in args.filter)
+
+# Read only the projected columns, plus whatever the filters, the cleaning rule and the year partitions need
+usecols = None
+if args.columns:
+    usecols = list(dict.fromkeys(args.columns + list(filters) + ['Data_Value', 'YearStart']))
+
+# In append mode the years already in the year partitions are skipped; otherwise the partitions are rebuilt.
+# Without partitions there is no record of what the existing outputs hold, so everything is rebuilt
+if args.append:
+    if args.columns and 'YearStart' not in args.columns:
+        parser.error('--append needs the YearStart column')
+    ingested = partition_years()
+    if ingested:
+        print(f"Years already ingested: {ingested}")
+    else:
+        print("No year partitions to append to, rebuilding the cleaned outputs")
+        args.append = False
+if not args.append:
+    ingested = []
+    shutil.rmtree(PARTITION_DIR, ignore_errors=True)
+
+
+def clean(chunk):
+    """Drop rows without a Data_Value, then apply the --filter predicates and the --columns projection."""
+    chunk = chunk.dropna(subset=['Data_Value'])
+    if ingested:
+        chunk = chunk[~chunk['YearStart'].isin(ingested)]
+    for column, value in filters.items():
+        chunk = chunk[chunk[column].astype(str) == value]
+    if args.columns:
+        chunk = chunk[[column for column in chunk.columns if column in args.columns]]
+    return chunk
+
+
+if args.chunksize is None:
+    # Load the CSV file
+    with stage('load') as metrics:
+        data = pd.read_csv(RAW_CSV, usecols=usecols)
+        metrics.rows_out = len(data)
+
+    # Drop rows where 'Data_Value' column has missing values
+    with stage('clean', rows_in=len(data)) as metrics:
+        data_cleaned = clean(data)
+        metrics.rows_out = len(data_cleaned)
+
+    # Save the cleaned data to a new CSV file and a typed Parquet file (or add it to the CSV in append mode)
+    with stage('save', rows_in=len(data_cleaned)):
+        if args.append:
+            with CleanedWriter(append=True) as writer:
+                writer.write(data_cleaned)
+        else:
+            save_cleaned(data_cleaned)
+        if 'YearStart' in data_cleaned.columns:
+            write_partitions(data_cleaned)
+
+    # Cache the count, sum and m2 of every (question, group, year) cell for the Step02 pivots
+    if set(STATISTICS_KEYS) <= set(data_cleaned.columns):
+        with stage('statistics', rows_in=len(data_cleaned)):
+            save_statistics(year_statistics(data_cleaned), append=args.append)
+
+    head = data_cleaned.head()
+    n_rows, n_columns = data_cleaned.shape
+else:
+    # Read the free-text columns as strings so every chunk gets the same dtypes
+    header = pd.read_csv(RAW_CSV, nrows=0, usecols=usecols).columns
+    dtype = {column: str for column in header if column not in ['YearStart', 'Data_Value'] + CATEGORY_COLUMNS}
+
+    # Clean the file chunk by chunk, appending each cleaned chunk to the outputs
+    head = None
+    n_read = n_rows = n_columns = 0
+    chunk_statistics = []
+    with stage('clean') as metrics, CleanedWriter(append=args.append) as writer:
+        for chunk in pd.read_csv(RAW_CSV, usecols=usecols, dtype=dtype, chunksize=args.chunksize):
+            chunk_cleaned = clean(chunk)
+            writer.write(chunk_cleaned)
+            if 'YearStart' in chunk_cleaned.columns:
+                write_partitions(chunk_cleaned)
+            if set(STATISTICS_KEYS) <= set(chunk_cleaned.columns):
+                chunk_statistics.append(year_statistics(chunk_cleaned))
+            if head is None:
+                head = chunk_cleaned.head()
+            elif len(head) < 5:
+                head = pd.concat([head, chunk_cleaned]).head()
+            n_rows += chunk_cleaned.shape[0]
+            n_columns = chunk_cleaned.shape[1]
+            n_read += len(chunk)
+        metrics.rows_in, metrics.rows_out = n_read, n_rows
 
-# Drop rows where 'Data_Value' column has missing values
-data_cleaned = data.dropna(subset=['Data_Value'])
+    # Merge the statistics of cells split across chunks and cache them for the Step02 pivots
+    if chunk_statistics:
+        with stage('statistics', rows_in=n_rows):
+            save_statistics(combine_statistics(pd.concat(chunk_statistics, ignore_index=True)), append=args.append)
 
-# Save the cleaned data to a new CSV file
-data_cleaned.to_csv('BRFSS_data_cleaned.csv', index=False)
+# Build the indexed store the analysis steps query (only possible when every index column was kept).
+# Streaming mode and appending never hold the whole table, so they rebuild it from just the store's
+# columns of the cleaned outputs
+if set(INDEX_COLUMNS) <= set(head.columns):
+    with stage('store', rows_in=n_rows):
+        if args.append or args.chunksize is not None:
+            data_cleaned = load_cleaned(columns=INDEX_COLUMNS + ['Data_Value'])
+        BRFSSStore.from_frame(data_cleaned).save(STORE_DIR)
+else:
+    shutil.rmtree(STORE_DIR, ignore_errors=True)
 
 # Display the first few rows of the cleaned data
-print(data_cleaned.head())
-print(f"Number of rows after cleaning: {data_cleaned.shape[0]}, Number of columns: {data_cleaned.shape[1]}")
+print(head)
+if args.append:
+    print(f"Number of rows appended: {n_rows}, years now ingested: {partition_years()}")
+else:
+    print(f"Number of rows after cleaning: {n_rows}, Number of columns: {n_columns}")
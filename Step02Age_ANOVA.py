@@ -1,22 +1,22 @@
-import pandas as pd
 from scipy.stats import shapiro, levene, f_oneway
-import matplotlib.pyplot as plt
 
-# Step 1: Load the cleaned CSV file
-data = pd.read_csv('BRFSS_data_cleaned.csv')
+from brfss_figures import FigureQueue, FigureSpec
+from brfss_metrics import stage
+from brfss_resampling import bootstrap_ci, permutation_test
+from brfss_strata import OBESITY_CLASS, OBESITY_QUESTION
+from brfss_yearstats import group_statistics, load_statistics, statistics_pivots
 
-# Step 2: Filter for "Obesity / Weight Status" in the Class column and "Percent of adults aged 18 years and older who have obesity" in the Question column
-data_filtered = data[(data['Class'] == 'Obesity / Weight Status') &
-                     (data['Question'] == 'Percent of adults aged 18 years and older who have obesity')]
+# Step 1: Load the per-year statistics of the obesity question for the age groups; the filters are
+# pushed down into the scan, so no other question or stratification is materialized
+with stage('load') as metrics:
+    statistics = load_statistics(Class=OBESITY_CLASS, Question=OBESITY_QUESTION, StratificationCategory1='Age (years)')
+    metrics.rows_out = len(statistics)
 
-# Step 3: Filter for "Age (years)" in StratificationCategory1
-data_age = data_filtered[data_filtered['StratificationCategory1'] == 'Age (years)']
-
-# Step 4: Pivot table to get obesity rates by year and age group
-data_pivot_age = data_age.pivot_table(index='YearStart', columns='Stratification1', values='Data_Value')
-
-# Drop any rows with missing values (years without data for all age groups)
-data_pivot_age = data_pivot_age.dropna()
+# Steps 2-4: Turn the yearly sums and counts into mean obesity rates by year, keeping the
+# "Age (years)" table (one column per age group, years without data for all groups dropped)
+with stage('pivot', rows_in=len(statistics)) as metrics:
+    data_pivot_age = statistics_pivots(statistics)['Age (years)']
+    metrics.rows_out = len(data_pivot_age)
 
 # Print the yearly obesity rate comparison table by age group
 print("Yearly Obesity Rates by Age Group:")
@@ -25,37 +25,44 @@ print(data_pivot_age)
 # Save the yearly obesity rate comparison to a CSV file
 data_pivot_age.to_csv('Yearly_Obesity_Rates_by_Age_Group.csv')
 
+# Print the count, mean and variance of the obesity rates of each age group over all years
+print("Obesity rates by age group over all years:")
+print(group_statistics(statistics, 'Age (years)'))
+
 # Step 5: Perform normality tests for each age group
-normality_results = {}
-for age_group in data_pivot_age.columns:
-    normality_test = shapiro(data_pivot_age[age_group])
-    normality_results[age_group] = normality_test
-    print(f"Normality test for {age_group}: {normality_test}")
+with stage('normality', rows_in=len(data_pivot_age)):
+    normality_results = {}
+    for age_group in data_pivot_age.columns:
+        normality_test = shapiro(data_pivot_age[age_group])
+        normality_results[age_group] = normality_test
+        print(f"Normality test for {age_group}: {normality_test}")
 
 # Step 6: Perform homogeneity of variances test (Levene's test) across age groups
-levene_test = levene(*[data_pivot_age[age_group] for age_group in data_pivot_age.columns])
-print(f"Levene’s test for equality of variances across age groups: {levene_test}")
+with stage('levene', rows_in=len(data_pivot_age)):
+    levene_test = levene(*[data_pivot_age[age_group] for age_group in data_pivot_age.columns])
+    print(f"Levene’s test for equality of variances across age groups: {levene_test}")
 
 # Step 7: Perform ANOVA to compare obesity rates across different age groups
-anova_test = f_oneway(*[data_pivot_age[age_group] for age_group in data_pivot_age.columns])
-print(f"ANOVA test result - F-statistic: {anova_test.statistic}, P-value: {anova_test.pvalue}")
-
-# Step 8: Visualization of obesity rates over time by age group
-plt.figure(figsize=(12, 8))
-
-# Plot a line for each age group
-for age_group in data_pivot_age.columns:
-    plt.plot(data_pivot_age.index, data_pivot_age[age_group], marker='o', label=age_group)
+with stage('anova', rows_in=len(data_pivot_age)):
+    anova_test = f_oneway(*[data_pivot_age[age_group] for age_group in data_pivot_age.columns])
+    print(f"ANOVA test result - F-statistic: {anova_test.statistic}, P-value: {anova_test.pvalue}")
 
-# Add titles and labels
-plt.title('Obesity Rates Over Time by Age Group (2011-2023)', fontsize=14)
-plt.xlabel('Year', fontsize=12)
-plt.ylabel('Obesity Rate (%)', fontsize=12)
-plt.legend(title='Age Group', loc='upper left', fontsize=10)
-plt.grid(axis='y', linestyle='--', alpha=0.7)
+# Step 8: Back the parametric test with a permutation test and bootstrap confidence intervals
+with stage('resampling', rows_in=len(data_pivot_age)):
+    permutation_result = permutation_test(data_pivot_age, statistic='f', seed=0)
+    print(f"Permutation ANOVA - F-statistic: {permutation_result.statistic}, P-value: {permutation_result.pvalue} "
+          f"({permutation_result.n_resamples} resamples)")
+    print("Bootstrap 95% confidence intervals for the mean obesity rates:")
+    print(bootstrap_ci(data_pivot_age, seed=0))
 
-# Save the visualization as an image
-plt.savefig('Obesity_Rates_by_Age_Group_Over_Time.png')
+# Step 9: Visualization of obesity rates over time by age group, with a line for each age group
+with stage('plotting', rows_in=len(data_pivot_age)):
+    figures = FigureQueue()
+    figures.submit(FigureSpec('lines', 'Obesity_Rates_by_Age_Group_Over_Time.png', data_pivot_age, {
+        'title': 'Obesity Rates Over Time by Age Group (2011-2023)',
+        'legend': {'title': 'Age Group', 'loc': 'upper left', 'fontsize': 10},
+    }))
 
-# Display the plot
-plt.show()
+    # Render queued figures (figures are only queued in headless mode, BRFSS_HEADLESS=1;
+    # otherwise submit() has already saved and displayed them)
+    figures.flush()
@@ -0,0 +1,118 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+from scipy.stats import f_oneway, levene, shapiro, ttest_ind
+
+from brfss_metrics import stage
+from brfss_resampling import permutation_test
+from brfss_shared import attach_store, share_store
+from brfss_store import load_store
+from brfss_strata import OBESITY_CLASS, OBESITY_QUESTION, stratification_pivots
+
+# The stratifications of the four Step02 scripts
+STEP02_STRATIFICATIONS = ['Gender', 'Age (years)', 'Education', 'Income']
+
+# Group order of the Step02 scripts where it differs from the pivots (the gender t statistic is Male - Female)
+TEST_ORDERS = {'Gender': ['Male', 'Female']}
+
+# Store of the current process: the parent's own store, or a worker's view of the shared one
+_store = None
+_blocks = []
+
+
+def _attach(spec):
+    """Pool initializer: map the shared (or memory-mapped) store once per worker process."""
+    global _store, _blocks
+    _blocks, _store = attach_store(spec)
+
+
+def parse_stratification(text):
+    """Parse "CATEGORY" or "CATEGORY=GROUP|GROUP|..." into (category, groups or None)."""
+    category, _, groups = text.partition('=')
+    return category, groups.split('|') if groups else None
+
+
+def analyze(category, groups=None, class_name=OBESITY_CLASS, question=OBESITY_QUESTION, n_resamples=10000):
+    """Run the Step02 test battery on one stratification of the store, optionally restricted to some groups."""
+    data = _store.slice(Class=class_name, Question=question, StratificationCategory1=category)
+    pivot = stratification_pivots(data, class_name, question).get(category, pd.DataFrame())
+    order = TEST_ORDERS.get(category, pivot.columns) if groups is None else groups
+    pivot = pivot[[group for group in order if group in pivot.columns]]
+    label = category if groups is None else f"{category} ({', '.join(pivot.columns)})"
+    result = {'stratification': label, 'groups': pivot.shape[1], 'years': pivot.shape[0]}
+    if pivot.shape[1] < 2 or pivot.shape[0] < 3:
+        return dict(result, test='skipped (needs 2+ groups and 3+ years)')
+
+    columns = [pivot[group] for group in pivot.columns]
+    normality = [shapiro(column) for column in columns]
+    levene_test = levene(*columns)
+    equal_var = levene_test.pvalue >= 0.05
+    if len(columns) == 2:
+        test, (statistic, pvalue) = 't-test', ttest_ind(*columns, equal_var=equal_var)
+    else:
+        test, (statistic, pvalue) = 'ANOVA', f_oneway(*columns)
+    permutation = permutation_test(pivot, statistic='t' if len(columns) == 2 else 'f', equal_var=equal_var,
+                                   n_resamples=n_resamples, seed=0)
+    return dict(result, min_normality_pvalue=min(normality_test.pvalue for normality_test in normality),
+                levene_statistic=levene_test.statistic, levene_pvalue=levene_test.pvalue,
+                test=test, statistic=statistic, pvalue=pvalue, permutation_pvalue=permutation.pvalue)
+
+
+def run_analyses(store, stratifications, class_name=OBESITY_CLASS, question=OBESITY_QUESTION,
+                 max_workers=None, n_resamples=10000):
+    """Analyse every (category, groups) stratification concurrently and gather the results in one table.
+
+    Every worker maps the store's saved arrays (a store built in memory is first copied once into
+    shared memory), so the data is neither copied nor pickled per task.
+    """
+    global _store
+    arguments = [(category, groups, class_name, question, n_resamples) for category, groups in stratifications]
+    if max_workers == 1 or len(arguments) == 1:
+        _store = store
+        return pd.DataFrame([analyze(*args) for args in arguments])
+
+    blocks, spec = share_store(store)
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_attach, initargs=(spec,)) as executor:
+            results = list(executor.map(analyze, *zip(*arguments)))
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+    return pd.DataFrame(results)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the Step02 analyses of every stratification at once.')
+    parser.add_argument('--stratifications', nargs='+', default=STEP02_STRATIFICATIONS,
+                        metavar='CATEGORY[=GROUP|GROUP...]',
+                        help='Stratifications to analyse, optionally restricted to some groups, '
+                             'e.g. "Race/Ethnicity" or "Income=Less than $15,000|$75,000 or greater"')
+    parser.add_argument('--all', action='store_true', help='Analyse every StratificationCategory1 in the data')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: one per CPU)')
+    parser.add_argument('--resamples', type=int, default=10000, help='Resamples of each permutation test')
+    parser.add_argument('--output', default='Step02_All_Analyses_Report.csv')
+    args = parser.parse_args()
+
+    # Step 1: Load the indexed store once (memory-mapped when Step01 saved it)
+    with stage('load') as metrics:
+        store = load_store()
+        metrics.rows_out = len(store.values)
+
+    stratifications = [parse_stratification(text) for text in args.stratifications]
+    if args.all:
+        stratifications = [(category, None) for category in store.categories['StratificationCategory1']]
+
+    # Steps 2-8: Pivot and test every stratification in its own worker process
+    with stage('analyses', rows_in=len(store.values)) as metrics:
+        report = run_analyses(store, stratifications, max_workers=args.workers or os.cpu_count(),
+                              n_resamples=args.resamples)
+        metrics.rows_out = len(report)
+
+    # Print and save the gathered report
+    print("Step02 analyses of every stratification:")
+    print(report.to_string(index=False))
+    report.to_csv(args.output, index=False)
+    print(f"Report saved to {args.output}")
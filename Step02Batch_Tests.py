@@ -0,0 +1,84 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from brfss_io import load_cleaned
+from brfss_metrics import stage
+from brfss_stats import anova_f, levene_w, shapiro_many, stack_groups, ttest
+
+# Every combination of these columns is one test group, compared across its Stratification1 values
+TEST_KEYS = ['Question', 'StratificationCategory1', 'LocationAbbr']
+
+
+def run_batch_tests(data, max_workers=None):
+    """Run the Step02 test battery (Shapiro, Levene, ANOVA, t-test) for every test group at once."""
+    tests, labels, values = stack_groups(data, TEST_KEYS)
+    n_groups = pd.notna(labels).sum(axis=1)
+    n_years = (~np.isnan(values)).any(axis=2).sum(axis=1)
+
+    def test_rows(name, statistic, pvalue, df1, df2, applies):
+        rows = tests.copy()
+        rows['Stratification1'] = np.nan
+        rows['test'] = name
+        rows['statistic'] = statistic
+        rows['pvalue'] = pvalue
+        rows['df1'] = df1
+        rows['df2'] = df2
+        rows['n_groups'] = n_groups
+        rows['n_years'] = n_years
+        return rows[applies]
+
+    # Step 5: Normality tests for every group, spread over a process pool
+    test_index, slot_index = np.nonzero(pd.notna(labels))
+    samples = [values[i, :, k][~np.isnan(values[i, :, k])] for i, k in zip(test_index, slot_index)]
+    shapiro_results = np.array(shapiro_many(samples, max_workers=max_workers), dtype=float).reshape(-1, 2)
+    normality = tests.iloc[test_index].reset_index(drop=True)
+    normality['Stratification1'] = labels[test_index, slot_index]
+    normality['test'] = 'shapiro'
+    normality['statistic'] = shapiro_results[:, 0]
+    normality['pvalue'] = shapiro_results[:, 1]
+    normality['df1'] = normality['df2'] = np.nan
+    normality['n_groups'] = n_groups[test_index]
+    normality['n_years'] = n_years[test_index]
+
+    # Steps 6-7: Levene, ANOVA and t-tests, computed for all test groups in vectorized passes
+    levene_stat, levene_p, levene_df1, levene_df2 = levene_w(values)
+    anova_stat, anova_p, anova_df1, anova_df2 = anova_f(values)
+    student_stat, student_p, student_df = ttest(values, equal_var=True)
+    welch_stat, welch_p, welch_df = ttest(values, equal_var=False)
+    several = n_groups >= 2
+    pair = n_groups == 2
+    frames = [
+        normality,
+        test_rows('levene', levene_stat, levene_p, levene_df1, levene_df2, several),
+        test_rows('anova', anova_stat, anova_p, anova_df1, anova_df2, several),
+        test_rows('ttest_student', student_stat, student_p, student_df, np.nan, pair),
+        test_rows('ttest_welch', welch_stat, welch_p, welch_df, np.nan, pair),
+    ]
+
+    results = pd.concat(frames, ignore_index=True)
+    return results.sort_values(TEST_KEYS, kind='stable').reset_index(drop=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the Step02 hypothesis tests for every question, '
+                                                 'stratification and location in the cleaned BRFSS data.')
+    parser.add_argument('--workers', type=int, default=None, help='Processes used for the Shapiro-Wilk tests')
+    parser.add_argument('--output', default='BRFSS_Batch_Test_Results.csv')
+    args = parser.parse_args()
+
+    # Step 1: Load the cleaned data, keeping only the columns the tests need
+    with stage('load') as metrics:
+        data = load_cleaned(columns=TEST_KEYS + ['Stratification1', 'YearStart', 'Data_Value'])
+        metrics.rows_out = len(data)
+
+    # Steps 2-7: Stack every test group and run the test battery
+    with stage('batch_tests', rows_in=len(data)) as metrics:
+        results = run_batch_tests(data, max_workers=args.workers)
+        metrics.rows_out = len(results)
+
+    # Save all results to a single tidy table
+    results.to_csv(args.output, index=False)
+    print(results.head(10))
+    print(f"Number of test results: {results.shape[0]}, saved to {args.output}")
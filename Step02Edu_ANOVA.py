@@ -1,27 +1,22 @@
-import pandas as pd
 from scipy.stats import shapiro, levene, f_oneway
-import matplotlib.pyplot as plt
 
-# Step 1: Load the cleaned CSV file
-data = pd.read_csv('BRFSS_data_cleaned.csv')
+from brfss_figures import FigureQueue, FigureSpec
+from brfss_metrics import stage
+from brfss_resampling import bootstrap_ci, permutation_test
+from brfss_strata import OBESITY_CLASS, OBESITY_QUESTION
+from brfss_yearstats import group_statistics, load_statistics, statistics_pivots
 
-# Step 2: Filter for "Obesity / Weight Status" in the Class column and "Percent of adults aged 18 years and older who have obesity" in the Question column
-data_filtered = data[(data['Class'] == 'Obesity / Weight Status') &
-                     (data['Question'] == 'Percent of adults aged 18 years and older who have obesity')]
+# Step 1: Load the per-year statistics of the obesity question for the education levels; the filters are
+# pushed down into the scan, so no other question or stratification is materialized
+with stage('load') as metrics:
+    statistics = load_statistics(Class=OBESITY_CLASS, Question=OBESITY_QUESTION, StratificationCategory1='Education')
+    metrics.rows_out = len(statistics)
 
-# Step 3: Filter for "Education" in StratificationCategory1, and exclude "Data not reported" in Stratification1
-data_education = data_filtered[(data_filtered['StratificationCategory1'] == 'Education') &
-                               (data_filtered['Stratification1'] != 'Data not reported')]
-
-# Step 4: Pivot table to get obesity rates by year and education level
-data_pivot_education = data_education.pivot_table(index='YearStart', columns='Stratification1', values='Data_Value')
-
-# Drop any rows with missing values (years without data for all education groups)
-data_pivot_education = data_pivot_education.dropna()
-
-# Reorder columns to have education levels from low to high
-education_order = ['Less than high school', 'High school graduate', 'Some college or technical school', 'College graduate']
-data_pivot_education = data_pivot_education[education_order]
+# Steps 2-4: Turn the yearly sums and counts into mean obesity rates by year, keeping the
+# "Education" table (education levels ordered from low to high, years without data for all groups dropped)
+with stage('pivot', rows_in=len(statistics)) as metrics:
+    data_pivot_education = statistics_pivots(statistics)['Education']
+    metrics.rows_out = len(data_pivot_education)
 
 # Print the yearly obesity rate comparison table by education level
 print("Yearly Obesity Rates by Education Level (Ordered from Low to High):")
@@ -30,37 +25,44 @@ print(data_pivot_education)
 # Save the yearly obesity rate comparison to a CSV file
 data_pivot_education.to_csv('Yearly_Obesity_Rates_by_Education_Level_Ordered_Low_to_High.csv')
 
+# Print the count, mean and variance of the obesity rates of each education level over all years
+print("Obesity rates by education level over all years:")
+print(group_statistics(statistics, 'Education'))
+
 # Step 5: Perform normality tests for each education group
-normality_results = {}
-for education_level in data_pivot_education.columns:
-    normality_test = shapiro(data_pivot_education[education_level])
-    normality_results[education_level] = normality_test
-    print(f"Normality test for {education_level}: {normality_test}")
+with stage('normality', rows_in=len(data_pivot_education)):
+    normality_results = {}
+    for education_level in data_pivot_education.columns:
+        normality_test = shapiro(data_pivot_education[education_level])
+        normality_results[education_level] = normality_test
+        print(f"Normality test for {education_level}: {normality_test}")
 
 # Step 6: Perform homogeneity of variances test (Levene's test) across education groups
-levene_test = levene(*[data_pivot_education[education_level] for education_level in data_pivot_education.columns])
-print(f"Levene’s test for equality of variances across education groups: {levene_test}")
+with stage('levene', rows_in=len(data_pivot_education)):
+    levene_test = levene(*[data_pivot_education[education_level] for education_level in data_pivot_education.columns])
+    print(f"Levene’s test for equality of variances across education groups: {levene_test}")
 
 # Step 7: Perform ANOVA to compare obesity rates across different education levels
-anova_test = f_oneway(*[data_pivot_education[education_level] for education_level in data_pivot_education.columns])
-print(f"ANOVA test result - F-statistic: {anova_test.statistic}, P-value: {anova_test.pvalue}")
-
-# Step 8: Visualization of obesity rates over time by education level
-plt.figure(figsize=(12, 8))
-
-# Plot a line for each education level
-for education_level in data_pivot_education.columns:
-    plt.plot(data_pivot_education.index, data_pivot_education[education_level], marker='o', label=education_level)
-
-# Add titles and labels
-plt.title('Obesity Rates Over Time by Education Level (2011-2023)', fontsize=14)
-plt.xlabel('Year', fontsize=12)
-plt.ylabel('Obesity Rate (%)', fontsize=12)
-plt.legend(title='Education Level', loc='upper left', fontsize=10)
-plt.grid(axis='y', linestyle='--', alpha=0.7)
-
-# Save the visualization as an image
-plt.savefig('Obesity_Rates_by_Education_Level_Over_Time.png')
-
-# Display the plot
-plt.show()
+with stage('anova', rows_in=len(data_pivot_education)):
+    anova_test = f_oneway(*[data_pivot_education[education_level] for education_level in data_pivot_education.columns])
+    print(f"ANOVA test result - F-statistic: {anova_test.statistic}, P-value: {anova_test.pvalue}")
+
+# Step 8: Back the parametric test with a permutation test and bootstrap confidence intervals
+with stage('resampling', rows_in=len(data_pivot_education)):
+    permutation_result = permutation_test(data_pivot_education, statistic='f', seed=0)
+    print(f"Permutation ANOVA - F-statistic: {permutation_result.statistic}, P-value: {permutation_result.pvalue} "
+          f"({permutation_result.n_resamples} resamples)")
+    print("Bootstrap 95% confidence intervals for the mean obesity rates:")
+    print(bootstrap_ci(data_pivot_education, seed=0))
+
+# Step 9: Visualization of obesity rates over time by education level, with a line for each education level
+with stage('plotting', rows_in=len(data_pivot_education)):
+    figures = FigureQueue()
+    figures.submit(FigureSpec('lines', 'Obesity_Rates_by_Education_Level_Over_Time.png', data_pivot_education, {
+        'title': 'Obesity Rates Over Time by Education Level (2011-2023)',
+        'legend': {'title': 'Education Level', 'loc': 'upper left', 'fontsize': 10},
+    }))
+
+    # Render queued figures (figures are only queued in headless mode, BRFSS_HEADLESS=1;
+    # otherwise submit() has already saved and displayed them)
+    figures.flush()
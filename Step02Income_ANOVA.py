@@ -1,28 +1,22 @@
-import pandas as pd
 from scipy.stats import shapiro, levene, f_oneway
-import matplotlib.pyplot as plt
 
-# Step 1: Load the cleaned CSV file
-data = pd.read_csv('BRFSS_data_cleaned.csv')
+from brfss_figures import FigureQueue, FigureSpec
+from brfss_metrics import stage
+from brfss_resampling import bootstrap_ci, permutation_test
+from brfss_strata import OBESITY_CLASS, OBESITY_QUESTION
+from brfss_yearstats import group_statistics, load_statistics, statistics_pivots
 
-# Step 2: Filter for "Obesity / Weight Status" in the Class column and "Percent of adults aged 18 years and older who have obesity" in the Question column
-data_filtered = data[(data['Class'] == 'Obesity / Weight Status') &
-                     (data['Question'] == 'Percent of adults aged 18 years and older who have obesity')]
+# Step 1: Load the per-year statistics of the obesity question for the income groups; the filters are
+# pushed down into the scan, so no other question or stratification is materialized
+with stage('load') as metrics:
+    statistics = load_statistics(Class=OBESITY_CLASS, Question=OBESITY_QUESTION, StratificationCategory1='Income')
+    metrics.rows_out = len(statistics)
 
-# Step 3: Filter for "Income" in StratificationCategory1, and exclude "Data not reported" in Stratification1
-data_income = data_filtered[(data_filtered['StratificationCategory1'] == 'Income') &
-                            (data_filtered['Stratification1'] != 'Data not reported')]
-
-# Step 4: Pivot table to get obesity rates by year and income group
-data_pivot_income = data_income.pivot_table(index='YearStart', columns='Stratification1', values='Data_Value')
-
-# Drop any rows with missing values (years without data for all income groups)
-data_pivot_income = data_pivot_income.dropna()
-
-# Reorder columns to have income groups from low to high
-income_order = ['Less than $15,000', '$15,000 - $24,999', '$25,000 - $34,999',
-                '$35,000 - $49,999', '$50,000 - $74,999', '$75,000 or greater']
-data_pivot_income = data_pivot_income[income_order]
+# Steps 2-4: Turn the yearly sums and counts into mean obesity rates by year, keeping the
+# "Income" table (income groups ordered from low to high, years without data for all groups dropped)
+with stage('pivot', rows_in=len(statistics)) as metrics:
+    data_pivot_income = statistics_pivots(statistics)['Income']
+    metrics.rows_out = len(data_pivot_income)
 
 # Print the yearly obesity rate comparison table by income group
 print("Yearly Obesity Rates by Income Group (Ordered by Income Level):")
@@ -31,37 +25,44 @@ print(data_pivot_income)
 # Save the yearly obesity rate comparison to a CSV file
 data_pivot_income.to_csv('Yearly_Obesity_Rates_by_Income_Group_Ordered.csv')
 
+# Print the count, mean and variance of the obesity rates of each income group over all years
+print("Obesity rates by income group over all years:")
+print(group_statistics(statistics, 'Income'))
+
 # Step 5: Perform normality tests for each income group
-normality_results = {}
-for income_group in data_pivot_income.columns:
-    normality_test = shapiro(data_pivot_income[income_group])
-    normality_results[income_group] = normality_test
-    print(f"Normality test for {income_group}: {normality_test}")
+with stage('normality', rows_in=len(data_pivot_income)):
+    normality_results = {}
+    for income_group in data_pivot_income.columns:
+        normality_test = shapiro(data_pivot_income[income_group])
+        normality_results[income_group] = normality_test
+        print(f"Normality test for {income_group}: {normality_test}")
 
 # Step 6: Perform homogeneity of variances test (Levene's test) across income groups
-levene_test = levene(*[data_pivot_income[income_group] for income_group in data_pivot_income.columns])
-print(f"Levene’s test for equality of variances across income groups: {levene_test}")
+with stage('levene', rows_in=len(data_pivot_income)):
+    levene_test = levene(*[data_pivot_income[income_group] for income_group in data_pivot_income.columns])
+    print(f"Levene’s test for equality of variances across income groups: {levene_test}")
 
 # Step 7: Perform ANOVA to compare obesity rates across different income groups
-anova_test = f_oneway(*[data_pivot_income[income_group] for income_group in data_pivot_income.columns])
-print(f"ANOVA test result - F-statistic: {anova_test.statistic}, P-value: {anova_test.pvalue}")
-
-# Step 8: Visualization of obesity rates over time by income group
-plt.figure(figsize=(12, 8))
-
-# Plot a line for each income group
-for income_group in data_pivot_income.columns:
-    plt.plot(data_pivot_income.index, data_pivot_income[income_group], marker='o', label=income_group)
-
-# Add titles and labels
-plt.title('Obesity Rates Over Time by Income Group (2011-2023)', fontsize=14)
-plt.xlabel('Year', fontsize=12)
-plt.ylabel('Obesity Rate (%)', fontsize=12)
-plt.legend(title='Income Group', loc='upper left', fontsize=10)
-plt.grid(axis='y', linestyle='--', alpha=0.7)
-
-# Save the visualization as an image
-plt.savefig('Obesity_Rates_by_Income_Group_Over_Time.png')
-
-# Display the plot
-plt.show()
+with stage('anova', rows_in=len(data_pivot_income)):
+    anova_test = f_oneway(*[data_pivot_income[income_group] for income_group in data_pivot_income.columns])
+    print(f"ANOVA test result - F-statistic: {anova_test.statistic}, P-value: {anova_test.pvalue}")
+
+# Step 8: Back the parametric test with a permutation test and bootstrap confidence intervals
+with stage('resampling', rows_in=len(data_pivot_income)):
+    permutation_result = permutation_test(data_pivot_income, statistic='f', seed=0)
+    print(f"Permutation ANOVA - F-statistic: {permutation_result.statistic}, P-value: {permutation_result.pvalue} "
+          f"({permutation_result.n_resamples} resamples)")
+    print("Bootstrap 95% confidence intervals for the mean obesity rates:")
+    print(bootstrap_ci(data_pivot_income, seed=0))
+
+# Step 9: Visualization of obesity rates over time by income group, with a line for each income group
+with stage('plotting', rows_in=len(data_pivot_income)):
+    figures = FigureQueue()
+    figures.submit(FigureSpec('lines', 'Obesity_Rates_by_Income_Group_Over_Time.png', data_pivot_income, {
+        'title': 'Obesity Rates Over Time by Income Group (2011-2023)',
+        'legend': {'title': 'Income Group', 'loc': 'upper left', 'fontsize': 10},
+    }))
+
+    # Render queued figures (figures are only queued in headless mode, BRFSS_HEADLESS=1;
+    # otherwise submit() has already saved and displayed them)
+    figures.flush()
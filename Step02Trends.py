@@ -0,0 +1,63 @@
+import argparse
+import os
+
+from brfss_metrics import stage
+from brfss_scan import scan
+from brfss_trends import SERIES_KEYS, TRENDS_CHECKPOINT, TrendTracker
+
+parser = argparse.ArgumentParser(description='Update the trend statistics of every group and state with the '
+                                             'survey years not tracked yet.')
+parser.add_argument('--window', type=int, default=5, help='Years in the rolling mean and variance')
+parser.add_argument('--alert-z', type=float, default=2.0,
+                    help='Flag series whose latest change per year exceeds this many rolling deviations')
+parser.add_argument('--checkpoint', default=TRENDS_CHECKPOINT)
+parser.add_argument('--rebuild', action='store_true', help='Ignore the checkpoint and start from scratch')
+args = parser.parse_args()
+
+# Step 1: Resume the accumulators from the last checkpoint
+with stage('load') as metrics:
+    if os.path.exists(args.checkpoint) and not args.rebuild:
+        try:
+            tracker = TrendTracker.load(args.checkpoint)
+        except ValueError as error:
+            parser.error(f'{error} (use --rebuild)')
+        if tracker.window != args.window:
+            parser.error(f'The checkpoint uses a {tracker.window}-year window (use --rebuild to change it)')
+    else:
+        tracker = TrendTracker(args.window)
+    print(f"Resumed {len(tracker)} series, years tracked: {tracker.years}")
+
+    # Only read the survey years the checkpoint has not seen (year partitions are pruned)
+    query = scan().select(*SERIES_KEYS, 'YearStart', 'Data_Value')
+    if tracker.years:
+        query = query.filter(('YearStart', 'not in', tracker.years))
+    data = query.collect()
+    metrics.rows_out = len(data)
+
+# Step 2: Update every series with the new observations, one vectorized step per year
+with stage('update', rows_in=len(data)) as metrics:
+    applied = tracker.update(data)
+    metrics.rows_out = applied
+print(f"Observations added: {applied}, series tracked: {len(tracker)}, years tracked: {tracker.years}")
+
+# Step 3: Checkpoint the accumulators for the next ingestion run
+with stage('checkpoint'):
+    tracker.save(args.checkpoint)
+
+# Step 4: Save the trend table and flag the current series that moved most since their previous observation.
+# A series is current until its next observation is due (questions asked every other year stay current
+# in the year after they were asked), and its change is per year, so both cadences share one threshold
+with stage('alerts') as metrics:
+    trends = tracker.to_frame()
+    trends.to_csv('Trend_Statistics.csv', index=False)
+    current = trends['last_year'] + trends['yoy_years'] > max(tracker.years, default=0)
+    current &= trends['Stratification1'] != 'Data not reported'
+    alerts = trends[current & (trends['yoy_delta'].abs() > args.alert_z * trends['rolling_variance'] ** 0.5)]
+    alerts = alerts.sort_values('yoy_delta', key=abs, ascending=False)
+    alerts.to_csv('Trend_Alerts.csv', index=False)
+    metrics.rows_out = len(alerts)
+
+print("Largest year-over-year changes:")
+columns = SERIES_KEYS[2:] + ['last_year', 'last_value', 'yoy_delta', 'rolling_mean', 'slope']
+print(alerts[columns].head(10).to_string(index=False))
+print(f"{len(alerts)} trend alerts saved to Trend_Alerts.csv, statistics of every series to Trend_Statistics.csv")
@@ -1,168 +1,197 @@
 # Import necessary libraries
+import argparse
+import os
+import re
+
+import numpy as np
 import pandas as pd
 import statsmodels.api as sm
-import matplotlib.pyplot as plt
-import seaborn as sns
+
+from brfss_figures import FigureQueue, FigureSpec
+from brfss_metrics import stage
+from brfss_longtable import CATEGORIES, DIMENSIONS, MODEL_VIEWS, LongTable
+from brfss_ols import fit_designs
+from brfss_predict import ALL_STATES, MODEL_DIR, TERMS, export_model, interaction_grid
+from brfss_scan import default_source, scan
+from brfss_store import load_store
+from brfss_strata import OBESITY_CLASS, OBESITY_QUESTION, pivots_from_means, stratification_pivots
+
+parser = argparse.ArgumentParser(description='Regress obesity rates on income, education and age group.')
+parser.add_argument('--from-store', action='store_true',
+                    help='Query the indexed BRFSS store instead of reading the Step02 CSV files')
+args = parser.parse_args()
 
 # Step 1: Load and Combine Data
 # -------------------------------------
 # Load the datasets for income, education, and age
-income_data = pd.read_csv('Yearly_Obesity_Rates_by_Income_Group_Ordered.csv')  # Obesity rates by income group
-education_data = pd.read_csv('Yearly_Obesity_Rates_by_Education_Level_Ordered_Low_to_High.csv')  # Obesity rates by education level
-age_data = pd.read_csv('Yearly_Obesity_Rates_by_Age_Group.csv')  # Obesity rates by age group
-
-# Convert the data into long format
-income_long = income_data.melt(id_vars=['YearStart'], var_name='IncomeGroup', value_name='ObesityRate')
-education_long = education_data.melt(id_vars=['YearStart'], var_name='EducationLevel', value_name='ObesityRate')
-age_long = age_data.melt(id_vars=['YearStart'], var_name='AgeGroup', value_name='ObesityRate')
-
-# Combine all datasets into a single DataFrame
-data_long = pd.concat([income_long, education_long, age_long], axis=0, ignore_index=True)
+with stage('load') as metrics:
+    if args.from_store:
+        # Pivot the three stratifications straight from the store, in the layout of the Step02 CSV files
+        pivots = stratification_pivots(load_store().slice(Class=OBESITY_CLASS, Question=OBESITY_QUESTION))
+        income_data, education_data, age_data = [
+            pivots[category].rename(columns=str).rename_axis(columns=None).reset_index()
+            for category in CATEGORIES.values()]
+    else:
+        income_data = pd.read_csv('Yearly_Obesity_Rates_by_Income_Group_Ordered.csv')  # Obesity rates by income group
+        education_data = pd.read_csv('Yearly_Obesity_Rates_by_Education_Level_Ordered_Low_to_High.csv')  # Obesity rates by education level
+        age_data = pd.read_csv('Yearly_Obesity_Rates_by_Age_Group.csv')  # Obesity rates by age group
+
+    # Stack the three tables into one compact long table: a year, an int8 dimension/level pair and a
+    # float32 rate per row, plus one design buffer holding the predictors of every model
+    table = LongTable.from_wide({'IncomeGroup': income_data, 'EducationLevel': education_data, 'AgeGroup': age_data})
+    metrics.rows_out = len(table)
 
 # Step 2: Encode and Reorder Categorical Variables
 # -------------------------------------
-# Reorder IncomeGroup categories
-data_long['IncomeGroup'] = pd.Categorical(data_long['IncomeGroup'],
-                                          categories=['Less than $15,000', '$15,000 - $24,999', '$25,000 - $34,999',
-                                                      '$35,000 - $49,999', '$50,000 - $74,999', '$75,000 or greater'],
-                                          ordered=True)
-
-# Reorder EducationLevel categories
-data_long['EducationLevel'] = pd.Categorical(data_long['EducationLevel'],
-                                             categories=['Less than high school', 'High school graduate',
-                                                         'Some college or technical school', 'College graduate'],
-                                             ordered=True)
-
-# Reorder AgeGroup categories
-data_long['AgeGroup'] = pd.Categorical(data_long['AgeGroup'],
-                                       categories=['18 - 24', '25 - 34', '35 - 44', '45 - 54', '55 - 64', '65 or older'],
-                                       ordered=True)
-
-# Encode categories for regression analysis
-data_long['IncomeGroup_encoded'] = data_long['IncomeGroup'].cat.codes
-data_long['EducationLevel_encoded'] = data_long['EducationLevel'].cat.codes
-data_long['AgeGroup_encoded'] = data_long['AgeGroup'].cat.codes
+# LongTable encodes the levels in the orders of brfss_longtable.DIMENSIONS (income and education from
+# low to high); a level missing from those orders, and every dimension a row does not belong to, is -1
 
 # Step 3: Perform Regression Analysis
 # -------------------------------------
 # Define the dependent variable
-y = data_long['ObesityRate']
-
-# Create interaction term for Income and Education
-data_long['Income_Education_Interaction'] = data_long['IncomeGroup_encoded'] * data_long['EducationLevel_encoded']
+y = table.response()
 
-X_interaction = data_long[['IncomeGroup_encoded', 'EducationLevel_encoded', 'Income_Education_Interaction']]
-X_interaction = sm.add_constant(X_interaction)  # Add constant term
+# Constant, income, education and their interaction term: a view of the table's design buffer
+X_interaction = table.model_frame('Full Model with Interactions')
 
 # Fit interaction model
-model_interaction = sm.OLS(y, X_interaction).fit()
+with stage('ols_fit', rows_in=len(table)):
+    model_interaction = sm.OLS(y, X_interaction).fit()
 print("Interaction Model Summary:\n", model_interaction.summary())
 
 # Step 4: Visualization
 # -------------------------------------
+# Figures are saved and displayed as they are submitted, or rendered in parallel at the end
+# of the script when BRFSS_HEADLESS=1
+figures = FigureQueue()
+
 def plot_income_education_interaction(model, income_categories, education_categories):
     """Plot a heatmap for interaction effects between Income and Education."""
-    # Define levels for income and education
-    income_levels = range(len(income_categories))
-    education_levels = range(len(education_categories))
-
-    # Construct prediction data (X_grid)
-    X_grid = []
-    for income in income_levels:
-        for education in education_levels:
-            row = [
-                1,  # Constant term
-                income,  # IncomeGroup_encoded
-                education,  # EducationLevel_encoded
-                income * education  # Income_Education_Interaction
-            ]
-            X_grid.append(row)
-
-    # Convert to DataFrame and ensure column order matches the regression model
-    X_grid = pd.DataFrame(
-        X_grid,
-        columns=['const', 'IncomeGroup_encoded', 'EducationLevel_encoded', 'Income_Education_Interaction']
-    )
+    # Construct prediction data (X_grid): every (income, education) pair, built in one vectorized step
+    grid = interaction_grid(len(income_categories), len(education_categories))
+    X_grid = pd.DataFrame(grid.reshape(-1, len(TERMS)), columns=TERMS)
 
     # Predict obesity rates
     y_pred = model.predict(X_grid)
-    y_pred_matrix = y_pred.values.reshape(len(income_levels), len(education_levels))
+    y_pred_matrix = y_pred.values.reshape(grid.shape[:2])
 
     # Plot the heatmap
-    plt.figure(figsize=(12, 8))
-    sns.heatmap(y_pred_matrix, xticklabels=education_categories, yticklabels=income_categories,
-                cmap='YlGnBu', annot=True, fmt=".1f", cbar_kws={'label': 'Predicted Obesity Rate'})
-    plt.title('Interaction Effect of Income and Education on Obesity Rate')
-    plt.xlabel('Education Level')
-    plt.ylabel('Income Group')
-    plt.xticks(rotation=0)  # Horizontal labels for X-axis
-    plt.tight_layout()
-    plt.show()
+    y_pred_table = pd.DataFrame(y_pred_matrix, index=list(income_categories), columns=list(education_categories))
+    figures.submit(FigureSpec('heatmap', 'Income_Education_Interaction_Heatmap.png', y_pred_table, {
+        'title': 'Interaction Effect of Income and Education on Obesity Rate',
+        'xlabel': 'Education Level',
+        'ylabel': 'Income Group',
+        'colorbar_label': 'Predicted Obesity Rate',
+    }))
 
 # Visualize the interaction between income and education
-income_categories = data_long['IncomeGroup'].cat.categories
-education_categories = data_long['EducationLevel'].cat.categories
-plot_income_education_interaction(model_interaction, income_categories, education_categories)
+income_categories = DIMENSIONS['IncomeGroup']
+education_categories = DIMENSIONS['EducationLevel']
+with stage('interaction_grid'):
+    plot_income_education_interaction(model_interaction, income_categories, education_categories)
 
 # Step 5: Residual Analysis
 # -------------------------------------
 def residual_analysis(model, model_name):
     """Perform residual analysis for the regression model."""
-    residuals = model.resid
-    fitted = model.fittedvalues
+    residuals = pd.DataFrame({'fitted': model.fittedvalues, 'residuals': model.resid})
+    file_name = re.sub(r'\W+', '_', model_name).strip('_')
 
     # Plot residuals vs fitted values
-    plt.figure(figsize=(8, 6))
-    sns.scatterplot(x=fitted, y=residuals, alpha=0.6)
-    plt.axhline(0, color='red', linestyle='--', linewidth=1)
-    plt.title(f'Residuals vs Fitted Values ({model_name})')
-    plt.xlabel('Fitted Values')
-    plt.ylabel('Residuals')
-    plt.tight_layout()
-    plt.show()
+    figures.submit(FigureSpec('residuals', f'Residuals_vs_Fitted_{file_name}.png', residuals, {
+        'title': f'Residuals vs Fitted Values ({model_name})',
+    }))
 
     # Check residuals normality
-    plt.figure(figsize=(8, 6))
-    sns.histplot(residuals, kde=True, bins=20)
-    plt.title(f'Residuals Distribution ({model_name})')
-    plt.xlabel('Residuals')
-    plt.ylabel('Density')
-    plt.tight_layout()
-    plt.show()
+    figures.submit(FigureSpec('residual_distribution', f'Residuals_Distribution_{file_name}.png', residuals, {
+        'title': f'Residuals Distribution ({model_name})',
+    }))
 
 # Perform residual analysis for the interaction model
-residual_analysis(model_interaction, "Interaction Model (Income and Education)")
+with stage('residual_analysis', rows_in=len(table)):
+    residual_analysis(model_interaction, "Interaction Model (Income and Education)")
 
 # Step 6: Print Model Summary
 # -------------------------------------
-def print_model_summary():
-    """Print a summary table for regression models."""
+# Design matrices of the model family, each a view of the table's design buffer (see MODEL_VIEWS)
+model_designs = {name: table.model_design(name) for name in MODEL_VIEWS}
+
+def print_model_summary(summary=False):
+    """Print a summary table for regression models (and their full statsmodels summaries if requested)."""
     print("\nModel Summary Table:\n")
 
-    # Age Model
-    X_age = sm.add_constant(data_long[['AgeGroup_encoded']])  # Use AgeGroup_encoded
-    model_age = sm.OLS(y, X_age).fit()
-    print(
-        f"Age Model: R² = {model_age.rsquared:.3f}, Key Variables = Age Group, Conclusion = Analyze how age affects obesity.")
+    # Fit every model from one shared design matrix
+    fits = fit_designs(model_designs, table.rate)
+    rsquared = fits.groupby('model', sort=False)['rsquared'].first()
 
-    # Income Model
-    X_income = sm.add_constant(data_long[['IncomeGroup_encoded']])
-    model_income = sm.OLS(y, X_income).fit()
     print(
-        f"Income Model: R² = {model_income.rsquared:.3f}, Key Variables = None, Conclusion = No significant independent effect.")
-
-    # Education Model
-    X_education = sm.add_constant(data_long[['EducationLevel_encoded']])
-    model_education = sm.OLS(y, X_education).fit()
+        f"Age Model: R² = {rsquared['Age Model']:.3f}, Key Variables = Age Group, Conclusion = Analyze how age affects obesity.")
     print(
-        f"Education Model: R² = {model_education.rsquared:.3f}, Key Variables = Education Level (Negative), Conclusion = Education is the most significant variable.")
-
-    # Full Model with Interactions
-    X_full = data_long[['IncomeGroup_encoded', 'EducationLevel_encoded', 'Income_Education_Interaction']]
-    X_full = sm.add_constant(X_full)
-    model_full = sm.OLS(y, X_full).fit()
+        f"Income Model: R² = {rsquared['Income Model']:.3f}, Key Variables = None, Conclusion = No significant independent effect.")
+    print(
+        f"Education Model: R² = {rsquared['Education Model']:.3f}, Key Variables = Education Level (Negative), Conclusion = Education is the most significant variable.")
     print(
-        f"Full Model with Interactions: R² = {model_full.rsquared:.3f}, Key Variables = Age-Income-Education Interactions, Conclusion = Interaction effects improved model slightly.")
+        f"Full Model with Interactions: R² = {rsquared['Full Model with Interactions']:.3f}, Key Variables = Age-Income-Education Interactions, Conclusion = Interaction effects improved model slightly.")
+
+    if summary:
+        for name in MODEL_VIEWS:
+            print(f"\n{name} Summary:\n", sm.OLS(y, table.model_frame(name)).fit().summary())
 
 # Call the function to print the summary
-print_model_summary()
+with stage('model_summary', rows_in=len(table)):
+    print_model_summary()
+
+# Step 7: Fit the Model Family per Year
+# -------------------------------------
+# All years are fitted together by the batched OLS engine and saved as one compact table
+with stage('ols_by_year', rows_in=len(table)) as metrics:
+    models_by_year = fit_designs(model_designs, table.rate, groups=pd.DataFrame({'YearStart': table.years}))
+    models_by_year.to_csv('Regression_Models_by_Year.csv', index=False)
+    metrics.rows_out = len(models_by_year)
+print("\nPer-year model coefficients, standard errors and R² saved to Regression_Models_by_Year.csv")
+
+# Render the figures queued in headless mode
+with stage('plotting'):
+    figures.flush()
+
+# Step 8: Export the Interaction Model for Serving
+# -------------------------------------
+# The interaction model is also fitted on each state's own yearly rates when a BRFSS table is on disk;
+# the pooled model and the state models are saved as one versioned artifact that
+# serve_predictions.py answers queries from
+def fit_state_models():
+    """Fit the interaction model once per LocationAbbr, on the state-level Step02 pivots."""
+    rows = scan().filter(('StratificationCategory1', 'in', list(CATEGORIES.values())),
+                         Class=OBESITY_CLASS, Question=OBESITY_QUESTION).select(
+        'LocationAbbr', 'StratificationCategory1', 'Stratification1', 'YearStart', 'Data_Value').collect()
+    rows = rows[rows['Stratification1'] != 'Data not reported']
+    means = rows.groupby(['LocationAbbr', 'StratificationCategory1', 'Stratification1', 'YearStart'],
+                         observed=True)['Data_Value'].mean()
+
+    # One long table holding every state's rows, fitted per state by the batched OLS engine
+    states, tables = [], []
+    for state, state_means in means.groupby(level='LocationAbbr', observed=True):
+        states.append(state)
+        tables.append(LongTable.from_pivots(pivots_from_means(state_means.droplevel('LocationAbbr'))))
+    state_table = LongTable.concat(tables)
+    groups = pd.DataFrame({'LocationAbbr': np.repeat(states, [len(table) for table in tables])})
+    name = 'Full Model with Interactions'
+    return fit_designs({name: state_table.model_design(name)}, state_table.rate, groups=groups)
+
+with stage('export_model') as metrics:
+    models = {ALL_STATES: {'coefficients': model_interaction.params[TERMS], 'rsquared': model_interaction.rsquared,
+                           'nobs': model_interaction.nobs}}
+    if os.path.exists(default_source()):
+        state_fits = fit_state_models()
+    else:
+        print(f"\nNo BRFSS table found ({default_source()}), exporting the pooled model without state models")
+        state_fits = pd.DataFrame(columns=['LocationAbbr'])
+    for state, fit in state_fits.groupby('LocationAbbr', sort=True):
+        coefficients = fit.set_index('term')['coef'][TERMS]
+        # Skip states with too few rates to determine the model
+        if fit['nobs'].iloc[0] > len(TERMS) and np.isfinite(coefficients).all():
+            models[state] = {'coefficients': coefficients, 'rsquared': fit['rsquared'].iloc[0],
+                             'nobs': fit['nobs'].iloc[0]}
+    version = export_model(models, income_categories, education_categories)
+    metrics.rows_out = len(models)
+print(f"\nInteraction model of {len(models) - 1} states exported to {MODEL_DIR} as version {version}")
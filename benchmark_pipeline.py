@@ -0,0 +1,207 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import scipy
+from scipy.stats import f_oneway, levene, shapiro, ttest_ind
+
+from brfss_cellstats import save_statistics, year_statistics
+from brfss_figures import FigureQueue, FigureSpec
+from brfss_io import ANALYSIS_COLUMNS, PARTITION_DIR, RAW_CSV, load_cleaned, save_cleaned, write_partitions
+from brfss_longtable import MODEL_VIEWS, LongTable
+from brfss_ols import fit_designs
+from brfss_resampling import permutation_test
+from brfss_scan import scan
+from brfss_store import BRFSSStore
+from brfss_strata import OBESITY_CLASS, OBESITY_QUESTION
+from brfss_synthetic import generate
+from brfss_yearstats import load_statistics, statistics_pivots
+from Step02Batch_Tests import run_batch_tests
+
+STEP02_CATEGORIES = ['Gender', 'Age (years)', 'Education', 'Income']
+
+
+def stage_clean(data):
+    """Step01 in memory: the cleaned table, its year partitions, the per-year statistics and the store."""
+    shutil.rmtree(PARTITION_DIR, ignore_errors=True)
+    data_cleaned = data.dropna(subset=['Data_Value'])
+    save_cleaned(data_cleaned)
+    write_partitions(data_cleaned)
+    save_statistics(year_statistics(data_cleaned))
+    BRFSSStore.from_frame(data_cleaned).save()
+    return data_cleaned
+
+
+def stage_tests(pivots):
+    results = {}
+    for category in STEP02_CATEGORIES:
+        columns = [pivots[category][group] for group in pivots[category].columns]
+        results[category] = ([shapiro(column) for column in columns], levene(*columns),
+                             ttest_ind(*columns) if category == 'Gender' else f_oneway(*columns))
+    return results
+
+
+def stage_resampling(pivots):
+    return {category: permutation_test(pivots[category], statistic='t' if category == 'Gender' else 'f', seed=0)
+            for category in STEP02_CATEGORIES}
+
+
+def stage_regression(pivots):
+    table = LongTable.from_pivots(pivots)
+    designs = {name: table.model_design(name) for name in MODEL_VIEWS}
+    return fit_designs(designs, table.rate), fit_designs(designs, table.rate,
+                                                         groups=pd.DataFrame({'YearStart': table.years}))
+
+
+def stage_plotting(pivots):
+    figures = FigureQueue(headless=True, manifest_path='benchmark_figures.json')
+    for category in STEP02_CATEGORIES:
+        figures.submit(FigureSpec('lines', f'benchmark_{category.split()[0]}.png', pivots[category], {
+            'title': f'Obesity Rates Over Time by {category}', 'legend': {'title': category}}))
+    if os.path.exists('benchmark_figures.json'):
+        os.remove('benchmark_figures.json')
+    return figures.flush()
+
+
+def reset_peak_rss():
+    """Reset the kernel's RSS high-water mark (VmHWM) so it covers only what runs next; False where unsupported."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb(reset):
+    """VmHWM since the last reset, or the process-wide ru_maxrss where resetting is not supported (None on Windows)."""
+    if reset:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 1024
+
+
+def benchmark_scale(scale, seed, track_memory):
+    """Generate a synthetic file of the given scale in the current directory and time every stage on it."""
+    generate(RAW_CSV, scale, seed)
+    records = []
+
+    def run(name, func, *args, **kwargs):
+        if track_memory:
+            tracemalloc.start()
+        reset = reset_peak_rss()
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        result = func(*args, **kwargs)
+        record = {'scale': scale, 'stage': name,
+                  'seconds': time.perf_counter() - start_wall, 'cpu_seconds': time.process_time() - start_cpu}
+        # Peak RSS during the stage (on Linux the high-water mark is reset before every stage; elsewhere
+        # it is the process's peak so far, see peak_rss_scope). tracemalloc adds the stage's own peak
+        # allocation but slows pandas down several times, so it is opt-in
+        record['peak_rss_mb'] = peak_rss_mb(reset)
+        record['peak_rss_scope'] = 'stage' if reset else 'process'
+        if track_memory:
+            record['peak_mb'] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            tracemalloc.stop()
+        records.append(record)
+        print(f"scale {scale:g} {name:<12} {record['seconds']:8.3f}s {record['peak_rss_mb'] or 0:8.0f} MB peak RSS"
+              + (f" {record['peak_mb']:8.1f} MB traced" if track_memory else ''))
+        return result
+
+    data = run('load', pd.read_csv, RAW_CSV)
+    rows = len(data)
+    run('scan', lambda: scan(RAW_CSV, raw=True).filter(Class=OBESITY_CLASS, Question=OBESITY_QUESTION)
+        .select('StratificationCategory1', 'Stratification1', 'YearStart', 'Data_Value').collect())
+    run('clean', stage_clean, data)
+    del data
+    # The Step02 scripts read the obesity statistics of their stratification and pivot them
+    statistics = run('filter', load_statistics, ('StratificationCategory1', 'in', STEP02_CATEGORIES),
+                     Class=OBESITY_CLASS, Question=OBESITY_QUESTION)
+    pivots = run('pivot', statistics_pivots, statistics)
+    run('tests', stage_tests, pivots)
+    run('batch_tests', lambda: run_batch_tests(load_cleaned(columns=ANALYSIS_COLUMNS + ['LocationAbbr']),
+                                               max_workers=1))
+    run('resampling', stage_resampling, pivots)
+    run('regression', stage_regression, pivots)
+    run('plotting', stage_plotting, pivots)
+    for record in records:
+        record['rows'] = rows
+    return records
+
+
+def compare(results, baseline, tolerance):
+    """Print the time ratio of every stage against a baseline run; return the stages that got slower."""
+    previous = {(record['scale'], record['stage']): record for record in baseline['results']}
+    regressions = []
+    for record in results:
+        before = previous.get((record['scale'], record['stage']))
+        if before is None:
+            continue
+        ratio = record['seconds'] / before['seconds'] if before['seconds'] else float('inf')
+        flag = ' SLOWER' if ratio > 1 + tolerance else ''
+        print(f"scale {record['scale']:g} {record['stage']:<12} {ratio:6.2f}x baseline{flag}")
+        if flag:
+            regressions.append(record)
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark every pipeline stage on synthetic BRFSS files.')
+    parser.add_argument('--scales', nargs='+', type=float, default=[1, 10], help='File sizes relative to the real export')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data-dir', default=None, help='Where to write the synthetic files (default: a temp dir)')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='Also record the peak allocation of every stage with tracemalloc (slows stages down)')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', default=None, help='Earlier results JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown before a stage is flagged')
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix='brfss_benchmark_')
+    os.makedirs(data_dir, exist_ok=True)
+    start_dir = os.getcwd()
+    os.chdir(data_dir)
+    os.environ.setdefault('MPLBACKEND', 'Agg')
+
+    results = []
+    try:
+        for scale in args.scales:
+            results.extend(benchmark_scale(scale, args.seed, args.trace_memory))
+    finally:
+        # The synthetic files are only kept when they were written to a --data-dir
+        os.chdir(start_dir)
+        if args.data_dir is None:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'environment': {'python': sys.version.split()[0], 'platform': platform.platform(),
+                        'cpu_count': os.cpu_count(), 'numpy': np.__version__, 'pandas': pd.__version__,
+                        'scipy': scipy.__version__},
+        'results': results,
+    }
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=1)
+    print(f"Benchmark results saved to {output}")
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        sys.exit(1 if compare(results, baseline, args.tolerance) else 0)
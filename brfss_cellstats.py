@@ -0,0 +1,35 @@
+import os
+
+from brfss_io import PARTITION_DIR
+
+# Per-year sufficient statistics of every question and group, appended to whenever a year is ingested
+STATISTICS_CSV = os.path.join(PARTITION_DIR, 'statistics.csv')
+
+# One row of statistics per combination of these columns
+STATISTICS_KEYS = ['Class', 'Question', 'StratificationCategory1', 'Stratification1', 'YearStart']
+
+
+def year_statistics(data):
+    """Count, sum and sum of squared deviations (m2) of Data_Value in every (question, group, year) cell."""
+    grouped = data.groupby(STATISTICS_KEYS, observed=True, sort=False)['Data_Value']
+    stats = grouped.agg(['count', 'sum', 'var'])
+    stats['m2'] = stats.pop('var').fillna(0) * (stats['count'] - 1)
+    return stats.reset_index()
+
+
+def combine_statistics(stats, keys=STATISTICS_KEYS):
+    """Merge statistics rows sharing the same keys (Chan et al.'s pairwise update of m2)."""
+    stats = stats[stats['count'] > 0]
+    grouped = stats.groupby(keys, observed=True, sort=False)
+    count = grouped['count'].transform('sum')
+    mean = grouped['sum'].transform('sum') / count
+    stats = stats.assign(m2=stats['m2'] + stats['count'] * (stats['sum'] / stats['count'] - mean) ** 2)
+    return stats.groupby(keys, observed=True, sort=False)[['count', 'sum', 'm2']].sum().reset_index()
+
+
+def save_statistics(stats, path=STATISTICS_CSV, append=False):
+    """Write the statistics file, or add the rows of newly ingested years to it."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    append = append and os.path.exists(path)
+    stats[STATISTICS_KEYS + ['count', 'sum', 'm2']].to_csv(path, mode='a' if append else 'w', header=not append,
+                                                           index=False)
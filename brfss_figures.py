@@ -0,0 +1,157 @@
+import hashlib
+import inspect
+import json
+import multiprocessing
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+# A figure to draw: the drawing function (a key of DRAWERS), the file it is saved to,
+# the table it plots and the keyword arguments of the drawing function
+FigureSpec = namedtuple('FigureSpec', ['kind', 'path', 'data', 'options'])
+
+
+def draw_lines(data, title, legend, figsize=(12, 8), styles=None):
+    """Obesity rate over time, one line per column of a Step02 pivot table."""
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=figsize)
+    for column in data.columns:
+        plt.plot(data.index, data[column], marker='o', label=column, **(styles or {}).get(column, {}))
+    plt.title(title, fontsize=14)
+    plt.xlabel('Year', fontsize=12)
+    plt.ylabel('Obesity Rate (%)', fontsize=12)
+    plt.legend(**legend)
+    plt.grid(axis='y', linestyle='--', alpha=0.7)
+
+
+def draw_heatmap(data, title, xlabel, ylabel, colorbar_label):
+    """Annotated heatmap of a table, rows on the y axis and columns on the x axis."""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    plt.figure(figsize=(12, 8))
+    sns.heatmap(data.to_numpy(), xticklabels=data.columns, yticklabels=data.index,
+                cmap='YlGnBu', annot=True, fmt=".1f", cbar_kws={'label': colorbar_label})
+    plt.title(title)
+    plt.xlabel(xlabel)
+    plt.ylabel(ylabel)
+    plt.xticks(rotation=0)  # Horizontal labels for X-axis
+    plt.tight_layout()
+
+
+def draw_residuals(data, title):
+    """Residuals against fitted values of a regression model."""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    plt.figure(figsize=(8, 6))
+    sns.scatterplot(x=data['fitted'], y=data['residuals'], alpha=0.6)
+    plt.axhline(0, color='red', linestyle='--', linewidth=1)
+    plt.title(title)
+    plt.xlabel('Fitted Values')
+    plt.ylabel('Residuals')
+    plt.tight_layout()
+
+
+def draw_residual_distribution(data, title):
+    """Histogram and density of the residuals of a regression model."""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    plt.figure(figsize=(8, 6))
+    sns.histplot(data['residuals'], kde=True, bins=20)
+    plt.title(title)
+    plt.xlabel('Residuals')
+    plt.ylabel('Density')
+    plt.tight_layout()
+
+
+DRAWERS = {
+    'lines': draw_lines,
+    'heatmap': draw_heatmap,
+    'residuals': draw_residuals,
+    'residual_distribution': draw_residual_distribution,
+}
+
+
+def spec_hash(spec):
+    """Hash of everything that affects a figure: its data, its options and the code drawing it."""
+    digest = hashlib.sha256()
+    digest.update(inspect.getsource(DRAWERS[spec.kind]).encode())
+    digest.update(pd.util.hash_pandas_object(spec.data, index=True).to_numpy().tobytes())
+    digest.update(repr(list(spec.data.columns)).encode())
+    digest.update(repr(sorted(spec.options.items())).encode())
+    return digest.hexdigest()
+
+
+def render(spec):
+    """Draw one figure with the non-interactive backend and save it to its path."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    DRAWERS[spec.kind](spec.data, **spec.options)
+    plt.savefig(spec.path)
+    plt.close('all')
+    return spec.path
+
+
+class FigureQueue:
+    """Collects the figures of a run and either shows them one by one or renders them headless.
+
+    Headless mode (`headless=True`, or BRFSS_HEADLESS=1 in the environment) never opens a window:
+    `flush()` renders every figure whose data changed since the last run in a pool of worker processes.
+    BRFSS_FIGURE_FORMAT=svg saves SVG files instead of PNG.
+    """
+
+    def __init__(self, headless=None, max_workers=None, manifest_path='.figure_hashes.json'):
+        if headless is None:
+            headless = os.environ.get('BRFSS_HEADLESS', '') not in ('', '0')
+        self.headless = headless
+        self.max_workers = max_workers
+        self.manifest_path = manifest_path
+        self.file_format = os.environ.get('BRFSS_FIGURE_FORMAT', 'png')
+        self.pending = []
+
+    def submit(self, spec):
+        """Queue a figure in headless mode, otherwise draw, save and display it right away."""
+        spec = spec._replace(path=os.path.splitext(spec.path)[0] + '.' + self.file_format)
+        if self.headless:
+            self.pending.append(spec)
+            return
+        import matplotlib.pyplot as plt
+
+        DRAWERS[spec.kind](spec.data, **spec.options)
+        plt.savefig(spec.path)
+        plt.show()
+
+    def flush(self):
+        """Render the queued figures whose data or options changed since they were last rendered."""
+        if not self.pending:
+            return []
+        manifest = {}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+
+        hashes = {spec.path: spec_hash(spec) for spec in self.pending}
+        stale = [spec for spec in self.pending
+                 if manifest.get(spec.path) != hashes[spec.path] or not os.path.exists(spec.path)]
+        self.pending = []
+
+        # Workers are forked so that scripts without a __main__ guard are not re-imported;
+        # where fork is unavailable the figures are rendered in this process instead
+        if len(stale) > 1 and 'fork' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('fork')
+            with ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context) as executor:
+                rendered = list(executor.map(render, stale))
+        else:
+            rendered = [render(spec) for spec in stale]
+
+        manifest.update({path: hashes[path] for path in rendered})
+        with open(self.manifest_path, 'w') as f:
+            json.dump(manifest, f, indent=1)
+        return rendered
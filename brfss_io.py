@@ -0,0 +1,165 @@
+import os
+
+import pandas as pd
+
+# File names shared by the cleaning step and the analysis steps
+RAW_CSV = 'BRFSS_data.csv'
+CLEANED_CSV = 'BRFSS_data_cleaned.csv'
+CLEANED_PARQUET = 'BRFSS_data_cleaned.parquet'
+
+# The cleaned table split by survey year: one YearStart=<year> directory of part files per year,
+# so a new release adds a directory instead of rewriting the history
+PARTITION_DIR = 'BRFSS_data_cleaned_by_year'
+
+# Repeated string columns, stored as dictionary-encoded categoricals in the columnar file
+CATEGORY_COLUMNS = ['Class', 'Question', 'StratificationCategory1', 'Stratification1', 'LocationAbbr']
+
+# Columns every Step02 analysis needs from the cleaned table
+ANALYSIS_COLUMNS = ['YearStart', 'Class', 'Question', 'StratificationCategory1', 'Stratification1', 'Data_Value']
+
+
+def apply_schema(data):
+    """Cast the BRFSS columns we rely on to the fixed columnar schema."""
+    data = data.copy()
+    for column in CATEGORY_COLUMNS:
+        if column in data.columns:
+            data[column] = data[column].astype('category')
+    if 'YearStart' in data.columns:
+        data['YearStart'] = data['YearStart'].astype('int16')
+    if 'Data_Value' in data.columns:
+        data['Data_Value'] = data['Data_Value'].astype('float64')
+    return data
+
+
+def save_cleaned(data, csv_path=CLEANED_CSV, parquet_path=CLEANED_PARQUET):
+    """Write the cleaned table as CSV and, when pyarrow is available, as typed Parquet."""
+    data.to_csv(csv_path, index=False)
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        print(f"pyarrow is not installed, skipping {parquet_path}")
+        return
+    apply_schema(data).to_parquet(parquet_path, index=False)
+
+
+def load_cleaned(columns=None, csv_path=CLEANED_CSV, parquet_path=CLEANED_PARQUET, partition_dir=PARTITION_DIR):
+    """Load the cleaned table, preferring the Parquet file, then the year partitions, and reading only `columns`."""
+    if os.path.exists(parquet_path):
+        try:
+            return pd.read_parquet(parquet_path, columns=columns)
+        except ImportError:
+            pass
+    if partition_years(partition_dir):
+        try:
+            return load_partitions(columns, directory=partition_dir)
+        except ImportError:
+            pass
+    return apply_schema(pd.read_csv(csv_path, usecols=columns))
+
+
+def partition_years(directory=PARTITION_DIR):
+    """Survey years already written to the year-partitioned cleaned table."""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(int(name.split('=', 1)[1]) for name in os.listdir(directory) if name.startswith('YearStart='))
+
+
+def write_partitions(data, directory=PARTITION_DIR):
+    """Add the rows of `data` to the year partitions, as one new part file in every year it contains."""
+    try:
+        import pyarrow  # noqa: F401
+        extension = '.parquet'
+    except ImportError:
+        extension = '.csv'
+    for year, rows in data.groupby('YearStart', sort=True):
+        year_dir = os.path.join(directory, f'YearStart={int(year)}')
+        os.makedirs(year_dir, exist_ok=True)
+        part = os.path.join(year_dir, f'part-{len(os.listdir(year_dir)):05d}{extension}')
+        if extension == '.parquet':
+            apply_schema(rows).to_parquet(part, index=False)
+        else:
+            rows.to_csv(part, index=False)
+
+
+def load_partitions(columns=None, years=None, directory=PARTITION_DIR):
+    """Load the cleaned rows of the given years (all years by default) from the year partitions."""
+    frames = []
+    for year in partition_years(directory) if years is None else years:
+        year_dir = os.path.join(directory, f'YearStart={int(year)}')
+        for name in sorted(os.listdir(year_dir)):
+            path = os.path.join(year_dir, name)
+            if name.endswith('.parquet'):
+                frames.append(pd.read_parquet(path, columns=columns))
+            else:
+                frames.append(pd.read_csv(path, usecols=columns))
+    # Part files have their own category sets, so the categories are rebuilt after concatenating
+    return apply_schema(pd.concat(frames, ignore_index=True))
+
+
+class CleanedWriter:
+    """Append cleaned chunks to the CSV and Parquet outputs without holding the whole table.
+
+    With `append=True` the chunks are added to the end of an existing cleaned CSV (in its column
+    order) and the Parquet file, which cannot be appended to, is removed instead of rewritten.
+    """
+
+    def __init__(self, csv_path=CLEANED_CSV, parquet_path=CLEANED_PARQUET, append=False):
+        self.csv_path = csv_path
+        self.parquet_path = parquet_path
+        self.parquet_writer = None
+        self.schema = None
+        self.started = False
+        self.csv_columns = None
+        if append and os.path.exists(csv_path):
+            self.started = True
+            self.csv_columns = pd.read_csv(csv_path, nrows=0).columns
+            if os.path.exists(parquet_path):
+                os.remove(parquet_path)
+            self.parquet_path = None
+            return
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            print(f"pyarrow is not installed, skipping {parquet_path}")
+            self.parquet_path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, chunk):
+        """Append one cleaned chunk; the first call also writes the CSV header."""
+        if self.csv_columns is not None:
+            chunk = chunk.reindex(columns=self.csv_columns)
+        chunk.to_csv(self.csv_path, mode='a' if self.started else 'w', header=not self.started, index=False)
+        if self.parquet_path is not None:
+            self._write_parquet(chunk)
+        self.started = True
+
+    def _write_parquet(self, chunk):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pandas(apply_schema(chunk), preserve_index=False)
+        if self.parquet_writer is None:
+            # Fix the schema from the first chunk: categories get a dictionary wide enough for every
+            # later chunk, and columns (or categories) that were entirely empty so far, as in a chunk
+            # the filters emptied, are assumed to hold strings
+            fields = []
+            for field in table.schema:
+                if pa.types.is_dictionary(field.type):
+                    value_type = pa.string() if pa.types.is_null(field.type.value_type) else field.type.value_type
+                    field = field.with_type(pa.dictionary(pa.int32(), value_type))
+                elif pa.types.is_null(field.type):
+                    field = field.with_type(pa.string())
+                fields.append(field)
+            self.schema = pa.schema(fields, metadata=table.schema.metadata)
+            self.parquet_writer = pq.ParquetWriter(self.parquet_path, self.schema)
+        self.parquet_writer.write_table(table.cast(self.schema))
+
+    def close(self):
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+            self.parquet_writer = None
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+
+from brfss_strata import age_order, education_order, income_order
+
+# Dimensions of the Step03 long table, in the order their wide tables are stacked, with their level orders
+DIMENSIONS = {'IncomeGroup': income_order, 'EducationLevel': education_order, 'AgeGroup': age_order}
+
+# StratificationCategory1 of the Step02 pivot behind each dimension
+CATEGORIES = {'IncomeGroup': 'Income', 'EducationLevel': 'Education', 'AgeGroup': 'Age (years)'}
+
+# Columns of the shared design buffer. The order lets every model's design matrix be a basic slice of it
+DESIGN_COLUMNS = ['AgeGroup_encoded', 'const', 'IncomeGroup_encoded', 'EducationLevel_encoded',
+                  'Income_Education_Interaction']
+
+# Design columns of each Step03 model, as slices of the buffer (a view, never a copy)
+MODEL_VIEWS = {
+    'Age Model': slice(0, 2),
+    'Income Model': slice(1, 3),
+    'Education Model': slice(1, 4, 2),
+    'Full Model with Interactions': slice(1, 5),
+}
+
+
+class LongTable:
+    """The Step03 regression table in compact form.
+
+    Each row is one (year, dimension, level) obesity rate: int16 years, int8 dimension and level codes
+    and float32 rates, instead of three mostly-empty string columns and their 64-bit encodings. The
+    predictors of every model live in one float64 buffer ordered like DESIGN_COLUMNS. As in the
+    original table, a row's code is -1 in the dimensions it does not belong to (and for levels outside
+    the known orders), and the interaction is the product of the income and education codes.
+    """
+
+    def __init__(self, years, dimension, level, rate):
+        self.years = years
+        self.dimension = dimension
+        self.level = level
+        self.rate = rate
+        self.design = np.empty((len(rate), len(DESIGN_COLUMNS)))
+        codes = {name: np.where(dimension == i, level, -1) for i, name in enumerate(DIMENSIONS)}
+        self.design[:, 0] = codes['AgeGroup']
+        self.design[:, 1] = 1.0
+        self.design[:, 2] = codes['IncomeGroup']
+        self.design[:, 3] = codes['EducationLevel']
+        self.design[:, 4] = codes['IncomeGroup'] * codes['EducationLevel']
+
+    @classmethod
+    def from_wide(cls, tables):
+        """Stack wide YearStart x level tables (a dict keyed by the DIMENSIONS names) into one long table."""
+        years, dimension, level, rate = [], [], [], []
+        for i, name in enumerate(DIMENSIONS):
+            wide = tables[name].set_index('YearStart') if 'YearStart' in tables[name].columns else tables[name]
+            positions = {group: code for code, group in enumerate(DIMENSIONS[name])}
+            codes = np.array([positions.get(str(column), -1) for column in wide.columns], dtype=np.int8)
+            # Column by column, like DataFrame.melt
+            years.append(np.tile(wide.index.to_numpy(dtype=np.int16), wide.shape[1]))
+            level.append(np.repeat(codes, wide.shape[0]))
+            dimension.append(np.full(wide.size, i, dtype=np.int8))
+            rate.append(wide.to_numpy(dtype=np.float32).ravel(order='F'))
+        return cls(np.concatenate(years), np.concatenate(dimension), np.concatenate(level), np.concatenate(rate))
+
+    @classmethod
+    def from_pivots(cls, pivots):
+        """Build the table from Step02 pivots keyed by StratificationCategory1 (a missing one adds no rows)."""
+        return cls.from_wide({name: pivots.get(category, pd.DataFrame()) for name, category in CATEGORIES.items()})
+
+    @classmethod
+    def concat(cls, tables):
+        """Stack several long tables into one, in order."""
+        return cls(*(np.concatenate([getattr(table, column) for table in tables])
+                     for column in ['years', 'dimension', 'level', 'rate']))
+
+    def __len__(self):
+        return len(self.rate)
+
+    def model_design(self, name):
+        """(terms, design matrix view) of one model of MODEL_VIEWS."""
+        view = MODEL_VIEWS[name]
+        return DESIGN_COLUMNS[view], self.design[:, view]
+
+    def model_frame(self, name):
+        """Design matrix of one model as a DataFrame over the buffer, for statsmodels."""
+        terms, X = self.model_design(name)
+        return pd.DataFrame(X, columns=terms, copy=False)
+
+    def response(self):
+        """The obesity rates as a float64 Series, as the regressions expect."""
+        return pd.Series(self.rate, name='ObesityRate', dtype=np.float64)
@@ -0,0 +1,136 @@
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+# Where stage metrics go: a ".prom" path gets a Prometheus text file, anything else JSON lines.
+# Unset (the default) turns the instrumentation off.
+METRICS_ENV = 'BRFSS_METRICS'
+
+# Name of one stage to profile, and how: "cprofile" (default) or "tracemalloc"
+PROFILE_STAGE_ENV = 'BRFSS_PROFILE_STAGE'
+PROFILE_MODE_ENV = 'BRFSS_PROFILE_MODE'
+
+# Prometheus metric of every numeric field of a stage record
+PROMETHEUS_METRICS = {
+    'wall_seconds': ('brfss_stage_wall_seconds', 'Wall-clock time of the stage'),
+    'cpu_seconds': ('brfss_stage_cpu_seconds', 'CPU time of the process during the stage'),
+    'peak_rss_delta_mb': ('brfss_stage_peak_rss_delta_megabytes', 'Growth of the peak RSS during the stage'),
+    'rows_in': ('brfss_stage_rows_in', 'Rows the stage read'),
+    'rows_out': ('brfss_stage_rows_out', 'Rows the stage produced'),
+}
+
+
+class StageMetrics:
+    """Row counts of a running stage, set by the code inside the `stage()` block."""
+
+    def __init__(self, rows_in=None):
+        self.rows_in = rows_in
+        self.rows_out = None
+
+
+# Handed out when instrumentation is off, so setting row counts costs nothing
+_DISABLED = StageMetrics()
+
+
+def _peak_rss_mb():
+    """Peak RSS of the process so far, or None where the `resource` module does not exist (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 1024
+
+
+@contextmanager
+def stage(name, rows_in=None):
+    """Record wall time, CPU time, peak RSS growth and row counts of the enclosed block.
+
+    Does nothing unless BRFSS_METRICS is set, or the block is the stage named by BRFSS_PROFILE_STAGE.
+    """
+    path = os.environ.get(METRICS_ENV)
+    profiled = os.environ.get(PROFILE_STAGE_ENV) == name
+    if not path and not profiled:
+        yield _DISABLED
+        return
+
+    metrics = StageMetrics(rows_in)
+    profiler = _start_profile() if profiled else None
+    start_rss = _peak_rss_mb()
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    try:
+        yield metrics
+    finally:
+        record = {
+            'script': os.path.basename(sys.argv[0]),
+            'stage': name,
+            'wall_seconds': time.perf_counter() - start_wall,
+            'cpu_seconds': time.process_time() - start_cpu,
+            'peak_rss_delta_mb': None if start_rss is None else _peak_rss_mb() - start_rss,
+            'rows_in': metrics.rows_in,
+            'rows_out': metrics.rows_out,
+            'timestamp': time.time(),
+        }
+        if profiler is not None:
+            _stop_profile(profiler, record['script'], name)
+        if path:
+            write_record(record, path)
+
+
+def write_record(record, path):
+    """Append a stage record to a JSON lines file, or update its samples in a Prometheus text file."""
+    if not path.endswith('.prom'):
+        with open(path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+        return
+
+    # The text file holds the latest sample of every script and stage; other samples are kept as they are
+    samples = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                if line.strip() and not line.startswith('#'):
+                    series, value = line.rsplit(' ', 1)
+                    samples[series] = value.strip()
+    labels = f'script="{record["script"]}",stage="{record["stage"]}"'
+    for field, (metric, _) in PROMETHEUS_METRICS.items():
+        if record[field] is not None:
+            samples[f'{metric}{{{labels}}}'] = repr(float(record[field]))
+
+    lines = []
+    for metric, description in PROMETHEUS_METRICS.values():
+        lines += [f'# HELP {metric} {description}', f'# TYPE {metric} gauge']
+        lines += [f'{series} {value}' for series, value in sorted(samples.items())
+                  if series.split('{')[0] == metric]
+    # Written to a temporary file first so a scraper never reads a half-written file
+    with open(path + '.tmp', 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(path + '.tmp', path)
+
+
+def _start_profile():
+    if os.environ.get(PROFILE_MODE_ENV, 'cprofile') == 'tracemalloc':
+        import tracemalloc
+        tracemalloc.start()
+        return tracemalloc
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def _stop_profile(profiler, script, name):
+    """Save the profile of a stage next to the outputs, as <script>.<stage>.prof or .tracemalloc.txt."""
+    prefix = f'{os.path.splitext(script)[0]}.{name}'
+    if hasattr(profiler, 'take_snapshot'):
+        snapshot = profiler.take_snapshot()
+        profiler.stop()
+        with open(prefix + '.tracemalloc.txt', 'w') as f:
+            for statistic in snapshot.statistics('lineno')[:25]:
+                f.write(f'{statistic}\n')
+    else:
+        profiler.disable()
+        profiler.dump_stats(prefix + '.prof')
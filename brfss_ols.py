@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+
+def batched_ols(X, y, mask=None):
+    """Fit a stack of OLS regressions with one batched pseudo-inverse.
+
+    `X` is a (fits x rows x terms) stack of design matrices and `y` the matching (fits x rows x responses)
+    stack of responses, so one design can be shared by many responses and many designs can be fitted
+    together. Fits with fewer rows are zero-padded and flagged by the (fits x rows) `mask`. Like
+    statsmodels, rank-deficient designs get the minimum-norm solution. Returns the coefficients and
+    standard errors (fits x terms x responses), the R² (fits x responses) and the rows used per fit.
+    """
+    if mask is None:
+        mask = np.ones(X.shape[:2], dtype=bool)
+    else:
+        X = np.where(mask[:, :, None], X, 0.0)
+        y = np.where(mask[:, :, None], y, 0.0)
+    nobs = mask.sum(axis=1)
+
+    # One factorization per design, shared by all of its responses
+    pinv = np.linalg.pinv(X)
+    params = pinv @ y
+    resid = (y - X @ params) * mask[:, :, None]
+    ssr = (resid ** 2).sum(axis=1)
+    y_mean = y.sum(axis=1) / nobs[:, None]
+    tss = (((y - y_mean[:, None, :]) * mask[:, :, None]) ** 2).sum(axis=1)
+
+    df_resid = nobs - np.linalg.matrix_rank(X)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        scale = ssr / df_resid[:, None]
+        rsquared = 1 - ssr / tss
+    bse = np.sqrt((pinv ** 2).sum(axis=2)[:, :, None] * scale[:, None, :])
+    return params, bse, rsquared, nobs
+
+
+def stack_designs(X, y, groups):
+    """Split one shared design matrix and response into zero-padded per-group stacks for `batched_ols`.
+
+    Returns the group keys (one row per stack entry), the stacked designs and responses and their mask.
+    """
+    columns = list(groups.columns)
+    codes = groups.groupby(columns, sort=True, dropna=False).ngroup().to_numpy()
+    keys = groups.drop_duplicates().sort_values(columns).reset_index(drop=True)
+    order = np.argsort(codes, kind='stable')
+    sizes = np.bincount(codes, minlength=len(keys))
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    positions = np.arange(len(codes)) - np.repeat(starts, sizes)
+
+    X_stack = np.zeros((len(keys), sizes.max(), X.shape[1]))
+    y_stack = np.zeros((len(keys), sizes.max(), 1))
+    mask = np.zeros((len(keys), sizes.max()), dtype=bool)
+    X_stack[codes[order], positions] = X[order]
+    y_stack[codes[order], positions, 0] = y[order]
+    mask[codes[order], positions] = True
+    return keys, X_stack, y_stack, mask
+
+
+def fit_designs(designs, y, groups=None):
+    """Fit prebuilt design matrices against one response, optionally once per row of the `groups` frame.
+
+    `designs` maps a model name to its (term names, design matrix) pair; the matrices may be views into
+    one shared buffer. Returns a compact table with one row per model, group and term (coefficient,
+    standard error, R² and rows used).
+    """
+    y = np.asarray(y, dtype=float)
+    frames = []
+    for name, (terms, X) in designs.items():
+        if groups is None:
+            keys = pd.DataFrame(index=[0])
+            params, bse, rsquared, nobs = batched_ols(X[None], y[None, :, None])
+        else:
+            keys, X_stack, y_stack, mask = stack_designs(X, y, groups)
+            params, bse, rsquared, nobs = batched_ols(X_stack, y_stack, mask)
+        table = keys.loc[keys.index.repeat(len(terms))].reset_index(drop=True)
+        table.insert(0, 'model', name)
+        table['term'] = np.tile(terms, len(keys))
+        table['coef'] = params[:, :, 0].ravel()
+        table['std_err'] = bse[:, :, 0].ravel()
+        table['rsquared'] = np.repeat(rsquared[:, 0], len(terms))
+        table['nobs'] = np.repeat(nobs, len(terms))
+        frames.append(table)
+    return pd.concat(frames, ignore_index=True)
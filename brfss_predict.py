@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Interaction models exported by Step03Regression.py: one JSON artifact per version, and a LATEST
+# file naming the current one. Only numpy is needed to load and query them (no statsmodels or pandas)
+MODEL_DIR = 'BRFSS_models'
+LATEST_FILE = 'LATEST'
+ARTIFACT_FORMAT = 1
+
+# Key of the model fitted on all the data (the Step03 model); the other keys are LocationAbbr codes
+ALL_STATES = 'ALL'
+
+# Terms of the exported model, in coefficient order
+TERMS = ['const', 'IncomeGroup_encoded', 'EducationLevel_encoded', 'Income_Education_Interaction']
+
+# Versions are the first hex digits of the artifact's SHA-256
+VERSION_PATTERN = re.compile(r'[0-9a-f]{12}')
+
+
+def interaction_grid(n_income, n_education):
+    """Design rows (TERMS) of every (income, education) code pair, as an (n_income, n_education, 4) array."""
+    income, education = np.indices((n_income, n_education), dtype=float)
+    return np.stack([np.ones_like(income), income, education, income * education], axis=-1)
+
+
+def artifact_path(version, directory=MODEL_DIR):
+    return os.path.join(directory, f'interaction_model_{version}.json')
+
+
+def _write_atomic(path, text):
+    """Write a file so that readers only ever see the old or the new content."""
+    temporary = f'{path}.tmp{os.getpid()}'
+    with open(temporary, 'w') as file:
+        file.write(text)
+    os.replace(temporary, path)
+
+
+def export_model(models, income_levels, education_levels, directory=MODEL_DIR):
+    """Save fitted interaction models as a new artifact version, point LATEST at it and return the version.
+
+    `models` maps ALL_STATES or a LocationAbbr to a dict with the TERMS `coefficients` and optionally
+    the `rsquared` and `nobs` of the fit. The version is a hash of the content, so exporting the same
+    models again reuses the same file.
+    """
+    states = list(models)
+    artifact = {
+        'format': ARTIFACT_FORMAT,
+        'terms': TERMS,
+        'income_levels': list(income_levels),
+        'education_levels': list(education_levels),
+        'states': states,
+        'coefficients': [[float(value) for value in models[state]['coefficients']] for state in states],
+        'rsquared': [float(models[state].get('rsquared', np.nan)) for state in states],
+        'nobs': [int(models[state].get('nobs', 0)) for state in states],
+    }
+    text = json.dumps(artifact, separators=(',', ':'))
+    version = hashlib.sha256(text.encode()).hexdigest()[:12]
+
+    os.makedirs(directory, exist_ok=True)
+    if not os.path.exists(artifact_path(version, directory)):
+        _write_atomic(artifact_path(version, directory), json.dumps(dict(artifact, version=version),
+                                                                    separators=(',', ':')))
+    _write_atomic(os.path.join(directory, LATEST_FILE), version + '\n')
+    return version
+
+
+class InteractionModel:
+    """One exported model version, ready to answer predictions.
+
+    The predictors only take a few discrete values, so loading evaluates the model of every state on
+    every (income, education) pair in one matrix product; a prediction is then an array lookup, and a
+    batch of queries is a single fancy-indexing operation.
+    """
+
+    def __init__(self, artifact):
+        if artifact.get('format') != ARTIFACT_FORMAT or artifact.get('terms') != TERMS:
+            raise ValueError(f"Unsupported model artifact (format {artifact.get('format')!r})")
+        self.version = artifact['version']
+        self.states = artifact['states']
+        self.income_levels = artifact['income_levels']
+        self.education_levels = artifact['education_levels']
+        self.coefficients = np.array(artifact['coefficients'], dtype=float).reshape(len(self.states), len(TERMS))
+        self.rsquared = dict(zip(self.states, artifact['rsquared']))
+        self.nobs = dict(zip(self.states, artifact['nobs']))
+
+        # states x income x education table of predicted rates
+        grid = interaction_grid(len(self.income_levels), len(self.education_levels))
+        self.predictions = np.moveaxis(grid @ self.coefficients.T, -1, 0)
+        self._codes = {
+            'state': {state: code for code, state in enumerate(self.states)},
+            'income': {level: code for code, level in enumerate(self.income_levels)},
+            'education': {level: code for code, level in enumerate(self.education_levels)},
+        }
+
+    @classmethod
+    def load(cls, version, directory=MODEL_DIR):
+        if not isinstance(version, str):
+            raise ValueError(f"Model versions are strings, not {version!r}")
+        if not VERSION_PATTERN.fullmatch(version):
+            raise KeyError(f"Invalid model version {version!r}")
+        path = artifact_path(version, directory)
+        if not os.path.exists(path):
+            raise KeyError(f"Unknown model version {version!r}")
+        with open(path) as file:
+            return cls(json.load(file))
+
+    def _encode(self, values, field):
+        """Codes of labels (or of integer codes, which are range-checked) of one query field."""
+        codes = self._codes[field]
+        values = np.asarray(values)
+        if values.dtype.kind == 'b':
+            raise ValueError(f"{field} must be a label or an integer code, not a boolean")
+        if values.dtype.kind == 'f':
+            if not np.all(np.mod(values, 1) == 0):
+                raise ValueError(f"{field} codes must be integers, got {values.tolist()!r}")
+            values = values.astype(np.intp)
+        elif values.dtype.kind not in 'iu':
+            try:
+                values = np.array([codes[value] if value in codes else int(value) for value in values.ravel()],
+                                  dtype=np.intp).reshape(values.shape)
+            except (TypeError, ValueError):
+                raise ValueError(f"Unknown {field} in {values.tolist()!r}") from None
+        if values.size and (values.min() < 0 or values.max() >= len(codes)):
+            raise ValueError(f"{field} code out of range 0-{len(codes) - 1}")
+        return values
+
+    def predict(self, income, education, state=ALL_STATES):
+        """Predicted obesity rates for income and education levels (labels or codes) and states.
+
+        Arguments may be scalars or arrays and are broadcast together; a float is returned for
+        scalar arguments, an array otherwise.
+        """
+        rates = self.predictions[self._encode(state, 'state'), self._encode(income, 'income'),
+                                 self._encode(education, 'education')]
+        return float(rates) if rates.ndim == 0 else rates
+
+    def predict_queries(self, queries):
+        """Predicted rates of a batch of {'income', 'education', 'state'} queries (state defaults to ALL_STATES)."""
+        if not all(isinstance(query, dict) and 'income' in query and 'education' in query for query in queries):
+            raise ValueError("Every query needs an 'income' and an 'education' level")
+        if any(isinstance(query.get(field), (list, dict))
+               for query in queries for field in ['income', 'education', 'state']):
+            raise ValueError("Query levels and states must be single labels or codes")
+        columns = [[query[field] for query in queries] for field in ['income', 'education']]
+        states = [query.get('state', ALL_STATES) for query in queries]
+        if not queries:
+            return np.empty(0)
+        return self.predict(*columns, states)
+
+    def describe(self):
+        return {'version': self.version, 'income_levels': self.income_levels,
+                'education_levels': self.education_levels, 'states': self.states}
+
+
+class ModelRegistry:
+    """Loads model versions on demand and keeps the `max_versions` most recently used ones in memory."""
+
+    def __init__(self, directory=MODEL_DIR, max_versions=4):
+        self.directory = directory
+        self.max_versions = max_versions
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+
+    def latest_version(self):
+        try:
+            with open(os.path.join(self.directory, LATEST_FILE)) as file:
+                return file.read().strip()
+        except FileNotFoundError:
+            raise KeyError(f"No model exported to {self.directory} yet (run Step03Regression.py)") from None
+
+    def versions(self):
+        """Every version on disk."""
+        names = os.listdir(self.directory) if os.path.isdir(self.directory) else []
+        return sorted(name[len('interaction_model_'):-len('.json')] for name in names
+                      if name.startswith('interaction_model_') and name.endswith('.json'))
+
+    def cached_versions(self):
+        with self._lock:
+            return list(self._models)
+
+    def get(self, version=None):
+        """The model of a version (the LATEST one by default), loading it if it is not cached."""
+        version = self.latest_version() if version is None else version
+        if not isinstance(version, str):
+            raise ValueError(f"Model versions are strings, not {version!r}")
+        with self._lock:
+            model = self._models.pop(version, None)
+            if model is None:
+                model = InteractionModel.load(version, self.directory)
+            self._models[version] = model
+            while len(self._models) > self.max_versions:
+                self._models.popitem(last=False)
+        return model
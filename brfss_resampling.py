@@ -0,0 +1,86 @@
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from brfss_stats import anova_f, ttest
+
+PermutationResult = namedtuple('PermutationResult', ['statistic', 'pvalue', 'n_resamples'])
+
+
+def _statistic(values, statistic, equal_var):
+    """t or F statistic of every resample in a (resamples x years x groups) array."""
+    if statistic == 't':
+        return ttest(values, equal_var=equal_var)[0]
+    return anova_f(values)[0]
+
+
+def _permutation_block(values, statistic, equal_var, size, seed):
+    # Shuffle the pooled observations across groups independently for every resample in the block
+    rng = np.random.default_rng(seed)
+    n_years, n_groups = values.shape
+    pooled = np.tile(values.T.ravel(), (size, 1))
+    shuffled = rng.permuted(pooled, axis=1).reshape(size, n_groups, n_years).transpose(0, 2, 1)
+    return _statistic(shuffled, statistic, equal_var)
+
+
+def _bootstrap_block(values, size, seed):
+    # Resample years with replacement within each group and keep the group means
+    rng = np.random.default_rng(seed)
+    n_years, n_groups = values.shape
+    index = rng.integers(0, n_years, size=(size, n_years, n_groups))
+    return np.take_along_axis(values[None, :, :], index, axis=1).mean(axis=1)
+
+
+def _run_blocks(block, n_resamples, block_size, seed, n_jobs):
+    """Run `block(size, seed)` over bounded-size blocks, optionally across processes.
+
+    Every block gets its own child seed, so results depend on `seed` but not on `n_jobs`.
+    """
+    sizes = [block_size] * (n_resamples // block_size)
+    if n_resamples % block_size:
+        sizes.append(n_resamples % block_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    if n_jobs == 1:
+        return np.concatenate([block(size, child) for size, child in zip(sizes, seeds)])
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        return np.concatenate(list(executor.map(block, sizes, seeds)))
+
+
+def permutation_test(pivot, statistic='f', equal_var=True, n_resamples=10000, block_size=1000, seed=None, n_jobs=1):
+    """Permutation p-value for a t (two columns) or F (any number of columns) test on a Step02 pivot.
+
+    The years of every column of `pivot` are one group; each resample shuffles all observations
+    across groups and recomputes the statistic, `block_size` resamples at a time.
+    """
+    values = pivot.to_numpy(dtype=float)
+    observed = _statistic(values[None, :, :], statistic, equal_var)[0]
+    block = partial(_permutation_block, values, statistic, equal_var)
+    resampled = _run_blocks(block, n_resamples, block_size, seed, n_jobs)
+    if statistic == 't':
+        extreme = np.abs(resampled) >= abs(observed)
+    else:
+        extreme = resampled >= observed
+    pvalue = (extreme.sum() + 1) / (n_resamples + 1)
+    return PermutationResult(observed, pvalue, n_resamples)
+
+
+def bootstrap_ci(pivot, confidence=0.95, n_resamples=10000, block_size=1000, seed=None, n_jobs=1):
+    """Percentile bootstrap confidence intervals for the column means of a Step02 pivot.
+
+    With two columns, the difference of their means (first minus second) is added as a last row.
+    """
+    values = pivot.to_numpy(dtype=float)
+    block = partial(_bootstrap_block, values)
+    means = _run_blocks(block, n_resamples, block_size, seed, n_jobs)
+    estimates = values.mean(axis=0)
+    labels = [str(column) for column in pivot.columns]
+    if values.shape[1] == 2:
+        means = np.column_stack([means, means[:, 0] - means[:, 1]])
+        estimates = np.append(estimates, estimates[0] - estimates[1])
+        labels.append(f"{labels[0]} - {labels[1]}")
+    alpha = (1 - confidence) / 2
+    lower, upper = np.quantile(means, [alpha, 1 - alpha], axis=0)
+    return pd.DataFrame({'mean': estimates, 'lower': lower, 'upper': upper}, index=labels)
@@ -0,0 +1,122 @@
+import operator
+import os
+
+import pandas as pd
+
+from brfss_io import CLEANED_CSV, CLEANED_PARQUET, PARTITION_DIR, RAW_CSV, apply_schema, partition_years
+
+# Rows read at a time from CSV sources; only the rows matching the filters of a chunk are kept
+CHUNKSIZE = 200_000
+
+# Comparison operators of a (column, op, value) predicate, the same set pyarrow accepts as Parquet filters
+OPERATORS = {
+    '==': operator.eq, '=': operator.eq, '!=': operator.ne,
+    '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+    'in': lambda series, values: series.isin(values),
+    'not in': lambda series, values: ~series.isin(values),
+}
+
+
+def default_source():
+    """The best BRFSS table on disk: the cleaned Parquet file, the year partitions, the cleaned CSV or the raw CSV."""
+    if os.path.exists(CLEANED_PARQUET):
+        return CLEANED_PARQUET
+    if partition_years():
+        return PARTITION_DIR
+    if os.path.exists(CLEANED_CSV):
+        return CLEANED_CSV
+    return RAW_CSV
+
+
+def _mask(data, predicates):
+    """Boolean mask of the rows of `data` satisfying every predicate."""
+    mask = pd.Series(True, index=data.index)
+    for column, op, value in predicates:
+        mask &= OPERATORS[op](data[column], value)
+    return mask
+
+
+class Scan:
+    """A lazy query over one BRFSS table: filters and a projection that `collect()` applies while reading.
+
+    Parquet files get the filters as pyarrow row filters and read only the needed columns; year
+    partitions are pruned by the YearStart filters before any file is opened; CSV files are parsed
+    with `usecols` in chunks and only the matching rows of each chunk are kept. With `raw=True` the
+    CSV is a raw export, and the Step01 cleaning rule is applied too (rows without a Data_Value are
+    dropped); by default that is only the case when the default source falls back to RAW_CSV.
+    """
+
+    def __init__(self, path=None, predicates=(), columns=None, chunksize=CHUNKSIZE, raw=None):
+        self.path = default_source() if path is None else path
+        self.raw = (path is None and self.path == RAW_CSV) if raw is None else raw
+        self.predicates = tuple(predicates)
+        self.columns = columns
+        self.chunksize = chunksize
+
+    def filter(self, *predicates, **equals):
+        """Keep the rows matching (column, op, value) predicates and column=value equalities."""
+        for column, op, value in predicates:
+            if op not in OPERATORS:
+                raise ValueError(f"Unsupported operator {op!r} in filter on {column}")
+        predicates += tuple((column, '==', value) for column, value in equals.items())
+        return Scan(self.path, self.predicates + predicates, self.columns, self.chunksize, self.raw)
+
+    def select(self, *columns):
+        """Only return these columns."""
+        return Scan(self.path, self.predicates, list(columns), self.chunksize, self.raw)
+
+    def explain(self):
+        """Describe what `collect()` will read."""
+        columns = 'all columns' if self.columns is None else ', '.join(self.columns)
+        filters = ' AND '.join(f'{column} {op} {value!r}' for column, op, value in self.predicates) or 'no filter'
+        return f"Scan {'raw ' if self.raw else ''}{self.path}: {columns} WHERE {filters}"
+
+    def _read_columns(self):
+        """Columns to read: the projection plus every column a filter needs."""
+        if self.columns is None:
+            return None
+        return list(dict.fromkeys(self.columns + [column for column, _, _ in self.predicates]))
+
+    def collect(self):
+        """Run the scan and return the matching rows as a DataFrame."""
+        if os.path.isdir(self.path):
+            frames = [self._collect_file(path) for path in self._partition_files()]
+            data = apply_schema(pd.concat(frames, ignore_index=True)) if frames else pd.DataFrame(columns=self.columns)
+        else:
+            data = self._collect_file(self.path)
+        data = data if self.columns is None else data[self.columns]
+        # Parquet dictionaries keep the categories of the whole file; only the matching ones are kept
+        for column in data.select_dtypes('category').columns:
+            data[column] = data[column].cat.remove_unused_categories()
+        return data
+
+    def _partition_files(self):
+        """Part files of the years passing the YearStart filters."""
+        years = pd.Series(partition_years(self.path), dtype='int64')
+        years = years[_mask(years.to_frame('YearStart'), [p for p in self.predicates if p[0] == 'YearStart'])]
+        for year in years:
+            year_dir = os.path.join(self.path, f'YearStart={year}')
+            for name in sorted(os.listdir(year_dir)):
+                yield os.path.join(year_dir, name)
+
+    def _collect_file(self, path):
+        columns = self._read_columns()
+        if path.endswith('.parquet'):
+            return pd.read_parquet(path, columns=columns, filters=list(self.predicates) or None)
+
+        if self.raw and columns is not None:
+            columns = list(dict.fromkeys(columns + ['Data_Value']))
+        frames = []
+        for chunk in pd.read_csv(path, usecols=columns, chunksize=self.chunksize, low_memory=False):
+            if self.raw:
+                chunk = chunk.dropna(subset=['Data_Value'])
+            frames.append(chunk[_mask(chunk, self.predicates)])
+        return apply_schema(pd.concat(frames, ignore_index=True))
+
+
+def scan(path=None, raw=None):
+    """Start a lazy query over a BRFSS table (by default the best one on disk, see `default_source`).
+
+    Pass `raw=True` when `path` is a raw export, so that its rows are cleaned like Step01 does.
+    """
+    return Scan(path, raw=raw)
@@ -0,0 +1,54 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from brfss_store import INDEX_COLUMNS, BRFSSStore
+
+
+def share_arrays(arrays):
+    """Copy numpy arrays into shared memory blocks.
+
+    Returns the blocks (keep them open, and unlink them when done) and a small picklable spec
+    that other processes pass to `attach_arrays` to map the same memory.
+    """
+    blocks, spec = [], {}
+    for key, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        blocks.append(block)
+        spec[key] = (block.name, array.dtype.str, array.shape)
+    return blocks, spec
+
+
+def attach_arrays(spec):
+    """Map the arrays described by a `share_arrays` spec, without copying them; returns (blocks, arrays)."""
+    blocks, arrays = [], {}
+    for key, (name, dtype, shape) in spec.items():
+        # Pool workers share the creating process's resource tracker, so attaching (which registers
+        # the block again) does not make the block outlive, or die with, the worker
+        block = shared_memory.SharedMemory(name=name)
+        blocks.append(block)
+        arrays[key] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+    return blocks, arrays
+
+
+def share_store(store):
+    """Make a BRFSSStore available to other processes; returns (blocks, spec) like `share_arrays`.
+
+    A memory-mapped store is already shared through the page cache, so the spec just names its
+    directory; only the arrays of a store built in memory are copied into shared memory blocks.
+    """
+    if store.directory is not None:
+        return [], {'directory': store.directory}
+    blocks, arrays = share_arrays(dict(store.codes, Data_Value=store.values))
+    return blocks, {'arrays': arrays, 'categories': store.categories, 'ranges': store.ranges}
+
+
+def attach_store(spec):
+    """Open the BRFSSStore of a `share_store` spec, without copying its arrays; returns (blocks, store)."""
+    if 'directory' in spec:
+        return [], BRFSSStore.load(spec['directory'])
+    blocks, arrays = attach_arrays(spec['arrays'])
+    codes = {column: arrays[column] for column in INDEX_COLUMNS}
+    return blocks, BRFSSStore(codes, spec['categories'], arrays['Data_Value'], spec['ranges'])
@@ -0,0 +1,106 @@
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.stats import f as f_dist, shapiro, t as t_dist
+
+
+def stack_groups(data, keys, group='Stratification1', year='YearStart', value='Data_Value'):
+    """Stack every test group of a long table into one (tests x years x groups) array.
+
+    Each combination of `keys` is one test; its `group` values are the samples being compared and
+    `year` indexes the observations, exactly like the columns and rows of a Step02 pivot table.
+    Years missing a value for any group of a test are blanked out for the whole test, like the
+    `dropna()` after each pivot. Returns the key table, the group labels per (test, slot) and the array.
+    """
+    data = data.loc[data[group] != 'Data not reported']
+    means = data.groupby(keys + [group, year], observed=True)[value].mean().reset_index()
+
+    # Number the tests, the years and the groups within each test
+    test_codes = means.groupby(keys, observed=True, sort=True).ngroup().to_numpy()
+    tests = means[keys].drop_duplicates().sort_values(keys).reset_index(drop=True)
+    year_codes, years = pd.factorize(means[year], sort=True)
+    group_codes, groups = pd.factorize(means[group], sort=True)
+    pairs, pair_codes = np.unique(test_codes * len(groups) + group_codes, return_inverse=True)
+    pair_tests = pairs // len(groups)
+    slot_codes = (np.arange(len(pairs)) - np.searchsorted(pair_tests, pair_tests))[pair_codes]
+    n_slots = int(slot_codes.max()) + 1 if len(slot_codes) else 0
+
+    values = np.full((len(tests), len(years), n_slots), np.nan)
+    values[test_codes, year_codes, slot_codes] = means[value].to_numpy()
+    labels = np.full((len(tests), n_slots), None, dtype=object)
+    labels[test_codes, slot_codes] = np.asarray(groups)[group_codes]
+
+    # Keep only the years where every group of the test has a value
+    present = ~np.isnan(values)
+    has_group = present.any(axis=1)
+    complete = (present | ~has_group[:, None, :]).all(axis=2)
+    values[~complete] = np.nan
+    return tests, labels, values
+
+
+def _moments(values):
+    """Per-group counts, means and within-group sums of squares of a stacked array."""
+    n = (~np.isnan(values)).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.nansum(values, axis=1) / n
+    ss = np.nansum((values - means[:, None, :]) ** 2, axis=1)
+    return n, means, ss
+
+
+def anova_f(values):
+    """One-way ANOVA F statistic and p-value for every test of a stacked array."""
+    n, means, ss = _moments(values)
+    n_groups = (n > 0).sum(axis=1)
+    n_total = n.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        grand = np.nansum(values, axis=(1, 2)) / n_total
+        ss_between = np.nansum(n * (means - grand[:, None]) ** 2, axis=1)
+        ss_within = ss.sum(axis=1)
+        df_between = n_groups - 1
+        df_within = n_total - n_groups
+        statistic = (ss_between / df_between) / (ss_within / df_within)
+    valid = (df_between > 0) & (df_within > 0)
+    statistic = np.where(valid, statistic, np.nan)
+    return statistic, f_dist.sf(statistic, df_between, df_within), df_between, df_within
+
+
+def levene_w(values):
+    """Levene's test (median-centred, as in scipy's default) for every test of a stacked array."""
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        medians = np.nanmedian(values, axis=1)
+    return anova_f(np.abs(values - medians[:, None, :]))
+
+
+def ttest(values, equal_var=True):
+    """Two-sample t statistic and two-sided p-value comparing group slots 0 and 1 of every test."""
+    n, means, ss = _moments(values[:, :, :2])
+    n1, n2 = n[:, 0], n[:, 1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        var1, var2 = ss[:, 0] / (n1 - 1), ss[:, 1] / (n2 - 1)
+        if equal_var:
+            df = n1 + n2 - 2
+            pooled = ((n1 - 1) * var1 + (n2 - 1) * var2) / df
+            stderr = np.sqrt(pooled * (1 / n1 + 1 / n2))
+        else:
+            a, b = var1 / n1, var2 / n2
+            df = (a + b) ** 2 / (a ** 2 / (n1 - 1) + b ** 2 / (n2 - 1))
+            stderr = np.sqrt(a + b)
+        statistic = (means[:, 0] - means[:, 1]) / stderr
+    return statistic, 2 * t_dist.sf(np.abs(statistic), df), df
+
+
+def _shapiro_batch(samples):
+    return [tuple(shapiro(sample)) if len(sample) >= 3 else (np.nan, np.nan) for sample in samples]
+
+
+def shapiro_many(samples, max_workers=None, batch_size=500):
+    """Run Shapiro-Wilk on many samples, spreading batches of them over a process pool."""
+    batches = [samples[i:i + batch_size] for i in range(0, len(samples), batch_size)]
+    if max_workers == 1 or len(batches) <= 1:
+        results = map(_shapiro_batch, batches)
+        return [result for batch in results for result in batch]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return [result for batch in executor.map(_shapiro_batch, batches) for result in batch]
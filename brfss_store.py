@@ -0,0 +1,153 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from brfss_io import load_cleaned
+
+STORE_DIR = 'BRFSS_store'
+
+# Sort order of the store; rows sharing a prefix of these columns are contiguous
+INDEX_COLUMNS = ['Class', 'Question', 'StratificationCategory1', 'Stratification1', 'LocationAbbr', 'YearStart']
+
+# Prefix depths with a hash index (few distinct values); deeper keys are found by binary search
+HASHED_DEPTH = 3
+
+
+class BRFSSStore:
+    """Cleaned BRFSS values sorted by INDEX_COLUMNS, with a hierarchical index for slice lookups.
+
+    Every index column is kept as an integer code array (sorted categories, so codes sort like the
+    values) next to the Data_Value array. Prefixes of the first HASHED_DEPTH columns map to row ranges
+    in a dict; the remaining columns are located inside that range with `np.searchsorted`, so a query
+    never scans rows outside the answer. `save()` writes plain .npy files that `load()` memory-maps,
+    letting several worker processes share one copy through the page cache; `directory` is the
+    directory a memory-mapped store was loaded from (None for a store in memory).
+    """
+
+    def __init__(self, codes, categories, values, ranges, directory=None):
+        self.codes = codes
+        self.categories = categories
+        self.values = values
+        self.ranges = ranges
+        self.directory = directory
+        self.lookup = {column: {value: code for code, value in enumerate(values)}
+                       for column, values in categories.items()}
+
+    @classmethod
+    def from_frame(cls, data):
+        """Build the store from a cleaned BRFSS DataFrame."""
+        codes, categories = {}, {}
+        for column in INDEX_COLUMNS:
+            column_codes, uniques = pd.factorize(data[column], sort=True)
+            codes[column] = column_codes.astype(np.int32)
+            categories[column] = uniques.tolist()
+        order = np.lexsort([codes[column] for column in reversed(INDEX_COLUMNS)])
+        codes = {column: np.ascontiguousarray(column_codes[order]) for column, column_codes in codes.items()}
+        values = data['Data_Value'].to_numpy(dtype=np.float64)[order]
+        return cls(codes, categories, values, cls._build_ranges(codes))
+
+    @staticmethod
+    def _build_ranges(codes):
+        """Row range of every distinct prefix of the hashed index columns."""
+        ranges = {}
+        n_rows = len(codes[INDEX_COLUMNS[0]])
+        for depth in range(1, HASHED_DEPTH + 1):
+            keys = np.column_stack([codes[column] for column in INDEX_COLUMNS[:depth]])
+            if n_rows == 0:
+                continue
+            starts = np.flatnonzero(np.r_[True, (keys[1:] != keys[:-1]).any(axis=1)])
+            stops = np.r_[starts[1:], n_rows]
+            for start, stop in zip(starts, stops):
+                ranges[tuple(int(code) for code in keys[start])] = (int(start), int(stop))
+        return ranges
+
+    def save(self, directory=STORE_DIR):
+        """Write the arrays as .npy files and the categories and hash index as JSON."""
+        os.makedirs(directory, exist_ok=True)
+        for column, column_codes in self.codes.items():
+            np.save(os.path.join(directory, f'{column}.npy'), column_codes)
+        np.save(os.path.join(directory, 'Data_Value.npy'), self.values)
+        meta = {
+            'categories': self.categories,
+            'ranges': [[list(key), list(bounds)] for key, bounds in self.ranges.items()],
+        }
+        with open(os.path.join(directory, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def load(cls, directory=STORE_DIR, mmap=True):
+        """Open a saved store, memory-mapping its arrays unless `mmap` is False."""
+        mode = 'r' if mmap else None
+        codes = {column: np.load(os.path.join(directory, f'{column}.npy'), mmap_mode=mode)
+                 for column in INDEX_COLUMNS}
+        values = np.load(os.path.join(directory, 'Data_Value.npy'), mmap_mode=mode)
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+        ranges = {tuple(key): tuple(bounds) for key, bounds in meta['ranges']}
+        return cls(codes, meta['categories'], values, ranges, os.path.abspath(directory) if mmap else None)
+
+    def _rows(self, query):
+        """Row range (or index array) of the rows matching `query`, a dict of column -> value."""
+        key = []
+        for column in INDEX_COLUMNS:
+            if column not in query:
+                break
+            code = self.lookup[column].get(query[column])
+            if code is None:
+                return slice(0, 0)
+            key.append(code)
+
+        # Hash lookup for the first levels of the prefix, binary search inside that range for the rest
+        start, stop = 0, len(self.values)
+        if key:
+            start, stop = self.ranges.get(tuple(key[:HASHED_DEPTH]), (0, 0))
+        for depth in range(HASHED_DEPTH, len(key)):
+            column_codes = self.codes[INDEX_COLUMNS[depth]][start:stop]
+            offset = start
+            start = offset + int(np.searchsorted(column_codes, key[depth], side='left'))
+            stop = offset + int(np.searchsorted(column_codes, key[depth], side='right'))
+        rows = slice(start, stop)
+
+        # Columns after a gap in the prefix are filtered within the range
+        remaining = [column for column in INDEX_COLUMNS[len(key):] if column in query]
+        if remaining:
+            mask = np.ones(stop - start, dtype=bool)
+            for column in remaining:
+                mask &= self.codes[column][rows] == self.lookup[column].get(query[column], -1)
+            rows = start + np.flatnonzero(mask)
+        return rows
+
+    def slice(self, **query):
+        """Rows matching equality conditions on INDEX_COLUMNS, as a DataFrame with categorical columns."""
+        unknown = set(query) - set(INDEX_COLUMNS)
+        if unknown:
+            raise KeyError(f"Not an index column of the store: {sorted(unknown)}")
+        rows = self._rows(query)
+        data = {}
+        for column in INDEX_COLUMNS:
+            column_codes = np.asarray(self.codes[column][rows])
+            if column == 'YearStart':
+                data[column] = np.asarray(self.categories[column], dtype=np.int16)[column_codes]
+            else:
+                data[column] = pd.Categorical.from_codes(column_codes, categories=self.categories[column])
+        data['Data_Value'] = np.asarray(self.values[rows])
+        return pd.DataFrame(data)
+
+    def pivot(self, exclude=('Data not reported',), **query):
+        """YearStart x Stratification1 table of mean Data_Value for the rows matching `query`.
+
+        Like the Step02 pivots, excluded groups are left out and years missing a group are dropped.
+        """
+        data = self.slice(**query)
+        data = data[~data['Stratification1'].isin(exclude)]
+        pivot = data.groupby(['YearStart', 'Stratification1'], observed=True)['Data_Value'].mean()
+        return pivot.unstack('Stratification1').dropna()
+
+
+def load_store(directory=STORE_DIR):
+    """Memory-map the saved store, or build one from the cleaned data if none was saved."""
+    if os.path.exists(os.path.join(directory, 'meta.json')):
+        return BRFSSStore.load(directory)
+    return BRFSSStore.from_frame(load_cleaned(columns=INDEX_COLUMNS + ['Data_Value']))
@@ -0,0 +1,43 @@
+# Obesity question analysed by the Step02 scripts
+OBESITY_CLASS = 'Obesity / Weight Status'
+OBESITY_QUESTION = 'Percent of adults aged 18 years and older who have obesity'
+
+# Column orderings for the stratifications that have one (education and income from low to high)
+gender_order = ['Female', 'Male']
+education_order = ['Less than high school', 'High school graduate', 'Some college or technical school', 'College graduate']
+income_order = ['Less than $15,000', '$15,000 - $24,999', '$25,000 - $34,999',
+                '$35,000 - $49,999', '$50,000 - $74,999', '$75,000 or greater']
+age_order = ['18 - 24', '25 - 34', '35 - 44', '45 - 54', '55 - 64', '65 or older']
+STRATIFICATION_ORDERS = {'Gender': gender_order, 'Education': education_order, 'Income': income_order}
+
+
+def stratification_pivots(data, class_name=OBESITY_CLASS, question=OBESITY_QUESTION, orders=STRATIFICATION_ORDERS):
+    """Pivot Data_Value by year for every StratificationCategory1 in a single groupby pass.
+
+    Returns a dict mapping each StratificationCategory1 to a YearStart x Stratification1 table,
+    the same table the Step02 scripts used to build one `pivot_table` at a time.
+    """
+    # Keep the rows of the requested question, excluding "Data not reported" groups
+    data = data.loc[(data['Class'] == class_name) & (data['Question'] == question) &
+                    (data['Stratification1'] != 'Data not reported'),
+                    ['StratificationCategory1', 'Stratification1', 'YearStart', 'Data_Value']]
+
+    # One groupby gives the mean obesity rate of every (category, group, year) cell
+    means = data.groupby(['StratificationCategory1', 'Stratification1', 'YearStart'], observed=True)['Data_Value'].mean()
+    return pivots_from_means(means, orders)
+
+
+def pivots_from_means(means, orders=STRATIFICATION_ORDERS):
+    """Split a (StratificationCategory1, Stratification1, YearStart) Series of means into the Step02 tables."""
+    pivots = {}
+    for category in means.index.get_level_values('StratificationCategory1').unique():
+        pivot = means.xs(category, level='StratificationCategory1').unstack('Stratification1')
+        pivot = pivot.loc[:, pivot.notna().any()]
+
+        # Put ordered stratifications in their natural order, keeping only the listed groups
+        if category in orders:
+            pivot = pivot[[group for group in orders[category] if group in pivot.columns]]
+
+        # Drop any rows with missing values (years without data for all groups)
+        pivots[category] = pivot.dropna()
+    return pivots
@@ -0,0 +1,158 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from brfss_io import RAW_CSV
+from brfss_strata import OBESITY_CLASS, OBESITY_QUESTION, education_order, income_order
+
+# Columns of the CDC "Nutrition, Physical Activity, and Obesity - BRFSS" export, in file order
+COLUMNS = ['YearStart', 'YearEnd', 'LocationAbbr', 'LocationDesc', 'Datasource', 'Class', 'Topic', 'Question',
+           'Data_Value_Unit', 'Data_Value_Type', 'Data_Value', 'Data_Value_Alt', 'Data_Value_Footnote_Symbol',
+           'Data_Value_Footnote', 'Low_Confidence_Limit', 'High_Confidence_Limit ', 'Sample_Size', 'Total',
+           'Age(years)', 'Education', 'Gender', 'Income', 'Race/Ethnicity', 'GeoLocation', 'ClassID', 'TopicID',
+           'QuestionID', 'DataValueTypeID', 'LocationID', 'StratificationCategory1', 'Stratification1',
+           'StratificationCategoryId1', 'StratificationID1']
+
+# (Class, Topic, Question, typical percentage) of the real export; larger scales add numbered variants
+QUESTIONS = [
+    (OBESITY_CLASS, 'Obesity / Weight Status', OBESITY_QUESTION, 30.0),
+    (OBESITY_CLASS, 'Obesity / Weight Status',
+     'Percent of adults aged 18 years and older who have an overweight classification', 35.0),
+    ('Physical Activity', 'Physical Activity - Behavior',
+     'Percent of adults who engage in no leisure-time physical activity', 25.0),
+    ('Physical Activity', 'Physical Activity - Behavior',
+     'Percent of adults who achieve at least 150 minutes a week of moderate-intensity aerobic physical activity '
+     'or 75 minutes a week of vigorous-intensity aerobic activity (or an equivalent combination)', 50.0),
+    ('Physical Activity', 'Physical Activity - Behavior',
+     'Percent of adults who engage in muscle-strengthening activities on 2 or more days a week', 30.0),
+    ('Fruits and Vegetables', 'Fruits and Vegetables - Behavior',
+     'Percent of adults who report consuming fruit less than one time daily', 38.0),
+    ('Fruits and Vegetables', 'Fruits and Vegetables - Behavior',
+     'Percent of adults who report consuming vegetables less than one time daily', 20.0),
+]
+
+# (StratificationCategory1, its column in the export, category id, [(Stratification1, id, effect)])
+STRATIFICATIONS = [
+    ('Total', 'Total', 'OVR', [('Total', 'OVERALL', 0.0)]),
+    ('Gender', 'Gender', 'GEN', [('Male', 'MALE', 0.5), ('Female', 'FEMALE', -0.5)]),
+    ('Age (years)', 'Age(years)', 'AGEYR', [
+        ('18 - 24', 'AGEYR1824', -8.0), ('25 - 34', 'AGEYR2534', -2.0), ('35 - 44', 'AGEYR3544', 2.0),
+        ('45 - 54', 'AGEYR4554', 4.0), ('55 - 64', 'AGEYR5564', 4.0), ('65 or older', 'AGEYR65PLUS', -1.0)]),
+    ('Education', 'Education', 'EDU', [
+        (level, f'EDU{i}', 4.0 - 2.5 * i) for i, level in enumerate(education_order)]),
+    ('Income', 'Income', 'INC', [
+        (group, f'INC{i}', 3.0 - 1.2 * i) for i, group in enumerate(income_order)] + [
+        ('Data not reported', 'INCNR', 0.0)]),
+    ('Race/Ethnicity', 'Race/Ethnicity', 'RACE', [
+        ('Non-Hispanic White', 'RACEWHT', 0.0), ('Non-Hispanic Black', 'RACEBLK', 8.0),
+        ('Hispanic', 'RACEHIS', 4.0), ('Asian', 'RACEASN', -18.0), ('Hawaiian/Pacific Islander', 'RACEHPI', 6.0),
+        ('American Indian/Alaska Native', 'RACENAA', 7.0), ('2 or more races', 'RACE2PLUS', 2.0),
+        ('Other', 'RACEOTH', 1.0)]),
+]
+
+STATES = ['AL', 'AK', 'AZ', 'AR', 'CA', 'CO', 'CT', 'DE', 'DC', 'FL', 'GA', 'HI', 'ID', 'IL', 'IN', 'IA', 'KS',
+          'KY', 'LA', 'ME', 'MD', 'MA', 'MI', 'MN', 'MS', 'MO', 'MT', 'NE', 'NV', 'NH', 'NJ', 'NM', 'NY', 'NC',
+          'ND', 'OH', 'OK', 'OR', 'PA', 'RI', 'SC', 'SD', 'TN', 'TX', 'UT', 'VT', 'VA', 'WA', 'WV', 'WI', 'WY',
+          'GU', 'PR', 'VI']
+
+FIRST_YEAR = 2011
+BASE_YEARS = 13
+
+
+def dimensions(scale):
+    """Years, locations and questions of a file `scale` times the size of the real export."""
+    growth = scale ** (1 / 3)
+    n_years = max(1, round(BASE_YEARS * growth))
+    n_locations = max(1, round((len(STATES) + 1) * growth))
+    n_questions = max(1, round(len(QUESTIONS) * growth))
+
+    years = list(range(FIRST_YEAR + BASE_YEARS - n_years, FIRST_YEAR + BASE_YEARS))
+    locations = ['US'] + STATES + [f'X{i:03d}' for i in range(n_locations - len(STATES) - 1)]
+    questions = []
+    for i in range(n_questions):
+        class_name, topic, question, base = QUESTIONS[i % len(QUESTIONS)]
+        if i >= len(QUESTIONS):
+            question = f'{question} (variant {i // len(QUESTIONS)})'
+        questions.append((class_name, topic, question, base))
+    return years, locations[:n_locations], questions
+
+
+def generate_year(year, locations, questions, rng, missing_rate=0.08):
+    """All rows of one survey year as a DataFrame with the export's columns."""
+    strata = [(category, column, category_id, group, group_id, effect)
+              for category, column, category_id, groups in STRATIFICATIONS
+              for group, group_id, effect in groups]
+    n_rows = len(locations) * len(questions) * len(strata)
+    location_index = np.repeat(np.arange(len(locations)), len(questions) * len(strata))
+    question_index = np.tile(np.repeat(np.arange(len(questions)), len(strata)), len(locations))
+    stratum_index = np.tile(np.arange(len(strata)), len(locations) * len(questions))
+
+    base = np.array([question[3] for question in questions])[question_index]
+    effect = np.array([stratum[5] for stratum in strata])[stratum_index]
+    location_effect = np.random.default_rng(len(locations)).normal(0, 3, len(locations))[location_index]
+    value = base + effect + location_effect + 0.3 * (year - FIRST_YEAR) + rng.normal(0, 1.5, n_rows)
+    value = np.clip(value, 1, 99).round(1)
+    sample_size = rng.integers(50, 20000, n_rows)
+    missing = rng.random(n_rows) < missing_rate
+    margin = (196 / np.sqrt(sample_size)).round(1)
+
+    location_abbr = np.array(locations, dtype=object)[location_index]
+    question_fields = np.array(questions, dtype=object)
+    stratum_fields = np.array(strata, dtype=object)
+    data = pd.DataFrame({
+        'YearStart': year,
+        'YearEnd': year,
+        'LocationAbbr': location_abbr,
+        'LocationDesc': np.where(location_abbr == 'US', 'National', location_abbr + ' (synthetic)'),
+        'Datasource': 'Behavioral Risk Factor Surveillance System',
+        'Class': question_fields[question_index, 0],
+        'Topic': question_fields[question_index, 1],
+        'Question': question_fields[question_index, 2],
+        'Data_Value_Unit': np.nan,
+        'Data_Value_Type': 'Value',
+        'Data_Value': np.where(missing, np.nan, value),
+        'Data_Value_Alt': np.where(missing, np.nan, value),
+        'Data_Value_Footnote_Symbol': np.where(missing, '~', None),
+        'Data_Value_Footnote': np.where(missing, 'Data not available because sample size is insufficient.', None),
+        'Low_Confidence_Limit': np.where(missing, np.nan, (value - margin).round(1)),
+        'High_Confidence_Limit ': np.where(missing, np.nan, (value + margin).round(1)),
+        'Sample_Size': np.where(missing, np.nan, sample_size),
+        'GeoLocation': None,
+        'ClassID': np.nan,
+        'TopicID': np.nan,
+        'QuestionID': [f'Q{index:03d}' for index in question_index],
+        'DataValueTypeID': 'VALUE',
+        'LocationID': location_index + 1,
+        'StratificationCategory1': stratum_fields[stratum_index, 0],
+        'Stratification1': stratum_fields[stratum_index, 3],
+        'StratificationCategoryId1': stratum_fields[stratum_index, 2],
+        'StratificationID1': stratum_fields[stratum_index, 4],
+    })
+    # The export repeats the group in the column of its stratification category
+    for category, column, category_id, groups in STRATIFICATIONS:
+        data[column] = np.where(data['StratificationCategory1'] == category, data['Stratification1'], None)
+    return data[COLUMNS]
+
+
+def generate(path=RAW_CSV, scale=1, seed=0):
+    """Write a synthetic BRFSS export `scale` times the real size, one year at a time; returns the row count."""
+    rng = np.random.default_rng(seed)
+    years, locations, questions = dimensions(scale)
+    n_rows = 0
+    for i, year in enumerate(years):
+        data = generate_year(year, locations, questions, rng)
+        data.to_csv(path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+        n_rows += len(data)
+    return n_rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write a synthetic BRFSS export with the real file\'s schema.')
+    parser.add_argument('--scale', type=float, default=1, help='Size relative to the real export (1, 10, 100, ...)')
+    parser.add_argument('--output', default=RAW_CSV)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    n_rows = generate(args.output, args.scale, args.seed)
+    print(f"Wrote {n_rows} rows to {args.output}")
@@ -0,0 +1,189 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from brfss_io import PARTITION_DIR
+
+# Checkpoint of the trend accumulators; kept next to the year partitions, so a full Step01 rebuild resets it
+TRENDS_CHECKPOINT = os.path.join(PARTITION_DIR, 'trends.json')
+
+# Version of the checkpoint layout; older checkpoints are rebuilt rather than misread
+CHECKPOINT_FORMAT = 2
+
+# A trend series: the yearly Data_Value of one group of one question in one state
+SERIES_KEYS = ['Class', 'Question', 'StratificationCategory1', 'Stratification1', 'LocationAbbr']
+
+# Per-series accumulators (float64 unless listed in INTEGER_FIELDS); the rolling window is kept apart
+FIELDS = ['count', 'mean', 'm2', 'year_mean', 'year_m2', 'comoment', 'last_year', 'last_value', 'delta',
+          'delta_years', 'window_count', 'window_mean', 'window_m2']
+INTEGER_FIELDS = ['count', 'last_year', 'delta_years', 'window_count']
+
+
+class TrendTracker:
+    """Online trend statistics of many yearly series, updated in O(1) per new observation.
+
+    Every series keeps Welford accumulators of its values (all-time mean and variance), of its values
+    in the `window` years up to its last observation (kept in `window` slots, from which the values of
+    years leaving the window are removed again, so questions asked every other year get a window of
+    the same length in years), and the co-moment of year and value that gives its least-squares
+    slope; plus its change since the previous observation, per year. The accumulators of all series
+    are numpy arrays, so a year of observations of thousands of series is one vectorized update.
+    Observations not newer than a series' last year are ignored.
+    """
+
+    def __init__(self, window=5):
+        if window < 2:
+            raise ValueError('The rolling window needs at least 2 years')
+        self.window = window
+        self.keys = pd.MultiIndex.from_tuples([], names=SERIES_KEYS)
+        self.years = []
+        self.state = {field: np.zeros(0, dtype=np.int64 if field in INTEGER_FIELDS else float) for field in FIELDS}
+        self.values = np.zeros((0, window))
+        self.value_years = np.zeros((0, window), dtype=np.int64)  # 0 marks an empty slot
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _series_codes(self, keys):
+        """Positions of the series in `keys` (a MultiIndex), adding the ones not tracked yet."""
+        new = keys[self.keys.get_indexer(keys) == -1].unique()
+        if len(new):
+            self.keys = self.keys.append(new)
+            for field, array in self.state.items():
+                self.state[field] = np.concatenate([array, np.zeros(len(new), dtype=array.dtype)])
+            self.values = np.concatenate([self.values, np.zeros((len(new), self.window))])
+            self.value_years = np.concatenate([self.value_years, np.zeros((len(new), self.window), dtype=np.int64)])
+        return self.keys.get_indexer(keys)
+
+    def update(self, data):
+        """Add the rows of `data` (SERIES_KEYS, YearStart and Data_Value), year by year in order.
+
+        Rows of the same series and year are averaged into one observation. Returns the number of
+        observations applied.
+        """
+        data = data.dropna(subset=['Data_Value'])
+        observations = data.groupby(SERIES_KEYS + ['YearStart'], observed=True, sort=False)['Data_Value'].mean()
+        observations = observations.reset_index().sort_values('YearStart', kind='stable')
+        if observations.empty:
+            return 0
+        codes = self._series_codes(pd.MultiIndex.from_frame(observations[SERIES_KEYS].astype(object)))
+        years = observations['YearStart'].to_numpy(dtype=np.int64)
+        values = observations['Data_Value'].to_numpy(dtype=float)
+
+        # Each year holds at most one observation per series, so a year is one vectorized update
+        applied = 0
+        bounds = np.flatnonzero(np.r_[True, years[1:] != years[:-1], True])
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            applied += self._add(codes[start:stop], int(years[start]), values[start:stop])
+        self.years = sorted(set(self.years) | set(np.unique(years).tolist()))
+        return applied
+
+    def _add(self, series, year, values):
+        s = self.state
+        seen = s['count'][series] > 0
+        fresh = ~seen | (s['last_year'][series] < year)
+        series, values, seen = series[fresh], values[fresh], seen[fresh]
+
+        # Year-over-year delta against the series' previous observation
+        s['delta'][series] = np.where(seen, values - s['last_value'][series], np.nan)
+        s['delta_years'][series] = np.where(seen, year - s['last_year'][series], 0)
+        s['last_year'][series] = year
+        s['last_value'][series] = values
+
+        # Welford update of the mean and m2 of the values and the years, and of their co-moment
+        count = s['count'][series] + 1
+        value_step = values - s['mean'][series]
+        year_step = year - s['year_mean'][series]
+        s['mean'][series] += value_step / count
+        s['year_mean'][series] += year_step / count
+        s['m2'][series] += value_step * (values - s['mean'][series])
+        s['year_m2'][series] += year_step * (year - s['year_mean'][series])
+        s['comoment'][series] += year_step * (values - s['mean'][series])
+        s['count'][series] = count
+
+        # Rolling window: remove the values of the years that left the window, then add the new one.
+        # The slots left hold years from year - window + 1 to year - 1, so one of them is free
+        window_count = s['window_count'][series]
+        window_mean = s['window_mean'][series]
+        window_m2 = s['window_m2'][series]
+        slot_years = self.value_years[series]
+        leaving = (slot_years > 0) & (slot_years <= year - self.window)
+        for slot in range(self.window):
+            old = self.values[series, slot]
+            remaining = window_count - leaving[:, slot]
+            reduced_mean = np.where(leaving[:, slot], (window_mean * window_count - old) / np.maximum(remaining, 1),
+                                    window_mean)
+            window_m2 = window_m2 - np.where(leaving[:, slot], (old - window_mean) * (old - reduced_mean), 0.0)
+            window_mean, window_count = np.where(remaining > 0, reduced_mean, 0.0), remaining
+        window_m2 = np.where(window_count > 1, window_m2, 0.0)
+        slot_years[leaving] = 0
+        free = np.argmax(slot_years == 0, axis=1)
+
+        window_count = window_count + 1
+        window_step = values - window_mean
+        s['window_mean'][series] = window_mean + window_step / window_count
+        s['window_m2'][series] = window_m2 + window_step * (values - s['window_mean'][series])
+        s['window_count'][series] = window_count
+        slot_years[np.arange(len(series)), free] = year
+        self.value_years[series] = slot_years
+        self.values[series, free] = values
+        return len(series)
+
+    def to_frame(self):
+        """The current trend statistics, one row per series.
+
+        `yoy_delta` is the change since the previous observation divided by the `yoy_years` between them,
+        and the rolling statistics cover the `window` years up to the series' `last_year`.
+        """
+        s = self.state
+        with np.errstate(invalid='ignore', divide='ignore'):
+            frame = pd.DataFrame({
+                'count': s['count'],
+                'last_year': s['last_year'],
+                'last_value': s['last_value'],
+                'yoy_delta': s['delta'] / s['delta_years'],
+                'yoy_years': s['delta_years'],
+                'mean': s['mean'],
+                'variance': s['m2'] / (s['count'] - 1),
+                'rolling_mean': s['window_mean'],
+                'rolling_variance': np.maximum(s['window_m2'], 0) / (s['window_count'] - 1),
+                'slope': s['comoment'] / s['year_m2'],
+            }, index=self.keys)
+        frame.loc[frame['count'] < 2, ['variance', 'slope']] = np.nan
+        frame.loc[s['window_count'] < 2, 'rolling_variance'] = np.nan
+        return frame.reset_index()
+
+    def save(self, path=TRENDS_CHECKPOINT):
+        """Write the accumulators to a JSON checkpoint (atomically) that `load` resumes from."""
+        checkpoint = {
+            'format': CHECKPOINT_FORMAT,
+            'window': self.window,
+            'years': self.years,
+            'keys': [list(key) for key in self.keys],
+            'state': {field: array.tolist() for field, array in self.state.items()},
+            'values': self.values.tolist(),
+            'value_years': self.value_years.tolist(),
+        }
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        temporary = f'{path}.tmp{os.getpid()}'
+        with open(temporary, 'w') as file:
+            json.dump(checkpoint, file, separators=(',', ':'))
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path=TRENDS_CHECKPOINT):
+        with open(path) as file:
+            checkpoint = json.load(file)
+        if checkpoint.get('format') != CHECKPOINT_FORMAT:
+            raise ValueError(f'{path} uses an older checkpoint layout and must be rebuilt')
+        tracker = cls(checkpoint['window'])
+        tracker.years = checkpoint['years']
+        tracker.keys = pd.MultiIndex.from_tuples([tuple(key) for key in checkpoint['keys']], names=SERIES_KEYS)
+        tracker.state = {field: np.array(checkpoint['state'][field], dtype=tracker.state[field].dtype)
+                         for field in FIELDS}
+        tracker.values = np.array(checkpoint['values'], dtype=float).reshape(len(tracker.keys), tracker.window)
+        tracker.value_years = np.array(checkpoint['value_years'], dtype=np.int64).reshape(len(tracker.keys),
+                                                                                        tracker.window)
+        return tracker
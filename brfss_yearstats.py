@@ -0,0 +1,46 @@
+import os
+
+import pandas as pd
+
+from brfss_cellstats import STATISTICS_CSV, STATISTICS_KEYS, combine_statistics, year_statistics
+from brfss_scan import scan
+from brfss_strata import OBESITY_CLASS, OBESITY_QUESTION, STRATIFICATION_ORDERS, pivots_from_means
+
+
+def load_statistics(*predicates, path=STATISTICS_CSV, **equals):
+    """Per-year statistics of the cells matching the filters (see `Scan.filter`).
+
+    Read from the statistics saved by Step01, or computed from the best BRFSS table on disk if there
+    are none; either way the filters are pushed down into the scan.
+    """
+    if os.path.exists(path):
+        return combine_statistics(scan(path).filter(*predicates, **equals).collect())
+    rows = scan().filter(*predicates, **equals).select(*STATISTICS_KEYS, 'Data_Value').collect()
+    return year_statistics(rows)
+
+
+def statistics_pivots(stats, class_name=OBESITY_CLASS, question=OBESITY_QUESTION, orders=STRATIFICATION_ORDERS):
+    """The Step02 YearStart x Stratification1 tables of mean Data_Value, from the per-year statistics.
+
+    Same result as `stratification_pivots` on the cleaned rows, in time proportional to the
+    number of (group, year) cells instead of the number of rows.
+    """
+    stats = stats[(stats['Class'] == class_name) & (stats['Question'] == question) &
+                  (stats['Stratification1'] != 'Data not reported')]
+    means = stats.set_index(['StratificationCategory1', 'Stratification1', 'YearStart'])
+    return pivots_from_means((means['sum'] / means['count']).sort_index(), orders)
+
+
+def group_statistics(stats, category, class_name=OBESITY_CLASS, question=OBESITY_QUESTION,
+                     orders=STRATIFICATION_ORDERS):
+    """Count, mean and variance of Data_Value per Stratification1 of one category, over all years."""
+    stats = stats[(stats['Class'] == class_name) & (stats['Question'] == question) &
+                  (stats['StratificationCategory1'] == category) & (stats['Stratification1'] != 'Data not reported')]
+    pooled = combine_statistics(stats, keys=['Stratification1']).set_index('Stratification1').sort_index()
+    if category in orders:
+        pooled = pooled.loc[[group for group in orders[category] if group in pooled.index]]
+    return pd.DataFrame({
+        'count': pooled['count'],
+        'mean': pooled['sum'] / pooled['count'],
+        'variance': pooled['m2'] / (pooled['count'] - 1),
+    })
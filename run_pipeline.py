@@ -0,0 +1,243 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from collections import namedtuple
+from modulefinder import ModuleFinder
+
+from brfss_io import CLEANED_CSV, CLEANED_PARQUET, PARTITION_DIR, RAW_CSV
+from brfss_predict import LATEST_FILE, MODEL_DIR
+from brfss_store import INDEX_COLUMNS, STORE_DIR
+from brfss_trends import TRENDS_CHECKPOINT
+from brfss_cellstats import STATISTICS_CSV
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# A pipeline step: the script to run, the data files it reads and writes, and extra command-line
+# arguments (part of its fingerprint like everything else). The repo modules whose code it depends
+# on are found from its imports, see `step_sources`
+PipelineStep = namedtuple('PipelineStep', ['name', 'script', 'inputs', 'outputs', 'args'])
+
+CLEANED = [CLEANED_CSV, CLEANED_PARQUET]
+STORE = [os.path.join(STORE_DIR, f'{column}.npy') for column in INDEX_COLUMNS + ['Data_Value']] + \
+        [os.path.join(STORE_DIR, 'meta.json')]
+# Inputs and outputs may be glob patterns: inputs are fingerprinted by the files they match, and the files
+# an output pattern matches are cached one by one (restoring a step also removes matches it did not write)
+PARTITIONS = [os.path.join(PARTITION_DIR, 'YearStart=*', '*')]
+
+STEPS = [
+    PipelineStep('clean', 'Step01_data_clean.py', [RAW_CSV], CLEANED + STORE + [STATISTICS_CSV] + PARTITIONS, []),
+    PipelineStep('gender', 'Step02Gender_Ttest.py', [STATISTICS_CSV],
+                 ['Yearly_Male_Female_Obesity_Rates.csv', 'Obesity_Rates_by_Gender_Over_Time.png'], []),
+    PipelineStep('age', 'Step02Age_ANOVA.py', [STATISTICS_CSV],
+                 ['Yearly_Obesity_Rates_by_Age_Group.csv', 'Obesity_Rates_by_Age_Group_Over_Time.png'], []),
+    PipelineStep('education', 'Step02Edu_ANOVA.py', [STATISTICS_CSV],
+                 ['Yearly_Obesity_Rates_by_Education_Level_Ordered_Low_to_High.csv',
+                  'Obesity_Rates_by_Education_Level_Over_Time.png'], []),
+    PipelineStep('income', 'Step02Income_ANOVA.py', [STATISTICS_CSV],
+                 ['Yearly_Obesity_Rates_by_Income_Group_Ordered.csv', 'Obesity_Rates_by_Income_Group_Over_Time.png'],
+                 []),
+    # load_store() rebuilds the store from the cleaned data when Step01 --append removed it
+    PipelineStep('all_analyses', 'Step02All_Analyses.py', STORE + CLEANED + [STATISTICS_CSV] + PARTITIONS,
+                 ['Step02_All_Analyses_Report.csv'], []),
+    PipelineStep('trends', 'Step02Trends.py', CLEANED,
+                 ['Trend_Statistics.csv', 'Trend_Alerts.csv', TRENDS_CHECKPOINT], []),
+    PipelineStep('batch_tests', 'Step02Batch_Tests.py', CLEANED, ['BRFSS_Batch_Test_Results.csv'], []),
+    PipelineStep('regression', 'Step03Regression.py',
+                 ['Yearly_Obesity_Rates_by_Income_Group_Ordered.csv',
+                  'Yearly_Obesity_Rates_by_Education_Level_Ordered_Low_to_High.csv',
+                  'Yearly_Obesity_Rates_by_Age_Group.csv'] + CLEANED,
+                 ['Regression_Models_by_Year.csv', 'Income_Education_Interaction_Heatmap.png',
+                  'Residuals_vs_Fitted_Interaction_Model_Income_and_Education.png',
+                  'Residuals_Distribution_Interaction_Model_Income_and_Education.png',
+                  os.path.join(MODEL_DIR, LATEST_FILE)], []),
+]
+
+
+class ArtifactCache:
+    """Content-addressed store of step outputs, keyed by step fingerprints and bounded in size."""
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.objects_dir = os.path.join(cache_dir, 'objects')
+        self.steps_dir = os.path.join(cache_dir, 'steps')
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.steps_dir, exist_ok=True)
+
+        # Hashes of files we have already read, keyed by path and invalidated by size and mtime
+        self.hash_index_path = os.path.join(cache_dir, 'file_hashes.json')
+        self.hash_index = {}
+        if os.path.exists(self.hash_index_path):
+            with open(self.hash_index_path) as f:
+                self.hash_index = json.load(f)
+
+    def file_hash(self, path):
+        """SHA-256 of a file, or None if it does not exist; unchanged files are not re-read."""
+        if not os.path.exists(path):
+            return None
+        stat = os.stat(path)
+        key = os.path.abspath(path)
+        cached = self.hash_index.get(key)
+        if cached and cached['size'] == stat.st_size and cached['mtime'] == stat.st_mtime_ns:
+            return cached['sha256']
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        self.hash_index[key] = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'sha256': digest.hexdigest()}
+        return digest.hexdigest()
+
+    def save_hash_index(self):
+        with open(self.hash_index_path, 'w') as f:
+            json.dump(self.hash_index, f)
+
+    def lookup(self, fingerprint):
+        """Output hashes recorded for a fingerprint, or None if any of them was evicted."""
+        manifest_path = os.path.join(self.steps_dir, fingerprint + '.json')
+        if not os.path.exists(manifest_path):
+            return None
+        with open(manifest_path) as f:
+            outputs = json.load(f)
+        if not all(os.path.exists(os.path.join(self.objects_dir, sha)) for sha in outputs.values() if sha):
+            return None
+        return outputs
+
+    def restore(self, outputs, data_dir):
+        """Bring every output file in `data_dir` back to its cached content."""
+        for name, sha in outputs.items():
+            path = os.path.join(data_dir, name)
+            if sha is None or self.file_hash(path) == sha:
+                continue
+            obj = os.path.join(self.objects_dir, sha)
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            shutil.copyfile(obj, path)
+            os.utime(obj)
+
+    def store(self, fingerprint, output_paths):
+        """Copy a step's outputs into the cache and record them under its fingerprint."""
+        outputs = {}
+        for name, path in output_paths.items():
+            sha = self.file_hash(path)
+            outputs[name] = sha
+            if sha is not None:
+                obj = os.path.join(self.objects_dir, sha)
+                if not os.path.exists(obj):
+                    shutil.copyfile(path, obj)
+                os.utime(obj)
+        with open(os.path.join(self.steps_dir, fingerprint + '.json'), 'w') as f:
+            json.dump(outputs, f)
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used objects until the cache fits in `max_bytes`."""
+        objects = [os.path.join(self.objects_dir, name) for name in os.listdir(self.objects_dir)]
+        objects.sort(key=os.path.getmtime)
+        total = sum(os.path.getsize(obj) for obj in objects)
+        for obj in objects:
+            if total <= self.max_bytes:
+                break
+            total -= os.path.getsize(obj)
+            os.remove(obj)
+
+
+def step_sources(script):
+    """The script and every repo module it imports, directly or not (imports inside functions included)."""
+    finder = ModuleFinder(path=[REPO_DIR])
+    finder.run_script(os.path.join(REPO_DIR, script))
+    modules = [os.path.relpath(module.__file__, REPO_DIR) for name, module in finder.modules.items()
+               if name != '__main__' and module.__file__]
+    return [script] + sorted(modules)
+
+
+def input_hash(cache, path):
+    """Hash of an input file, or of every file matching an input glob pattern (None if nothing matches)."""
+    if not glob.has_magic(path):
+        return cache.file_hash(path)
+    matches = sorted(glob.glob(path))
+    if not matches:
+        return None
+    hashes = {os.path.relpath(match, os.path.dirname(path)): cache.file_hash(match) for match in matches}
+    return hashlib.sha256(json.dumps(hashes, sort_keys=True).encode()).hexdigest()
+
+
+def output_paths(step, data_dir):
+    """The output files of a step, by name relative to `data_dir`, with the matches of output patterns."""
+    paths = {}
+    for name in step.outputs:
+        if glob.has_magic(name):
+            for path in sorted(glob.glob(os.path.join(data_dir, name))):
+                paths[os.path.relpath(path, data_dir)] = path
+        else:
+            paths[name] = os.path.join(data_dir, name)
+    return paths
+
+
+def stale_outputs(step, outputs, data_dir):
+    """Files matching an output pattern of the step that are not among its cached `outputs`."""
+    return [path for name, path in output_paths(step, data_dir).items() if name not in outputs]
+
+
+def step_fingerprint(step, cache, data_dir):
+    """Hash of everything a step's outputs depend on: its code, its input files and its arguments."""
+    sources = step_sources(step.script)
+    fingerprint = {
+        'sources': {name: cache.file_hash(os.path.join(REPO_DIR, name)) for name in sources},
+        'inputs': {name: input_hash(cache, os.path.join(data_dir, name)) for name in step.inputs},
+        'args': step.args,
+    }
+    return hashlib.sha256(json.dumps(fingerprint, sort_keys=True).encode()).hexdigest()
+
+
+def run_pipeline(steps, data_dir='.', cache_dir='.pipeline_cache', max_bytes=1 << 30, force=()):
+    """Run the steps in order, skipping or restoring every step whose fingerprint is already cached."""
+    cache = ArtifactCache(os.path.join(data_dir, cache_dir), max_bytes)
+    env = dict(os.environ, BRFSS_HEADLESS='1', PYTHONPATH=os.pathsep.join(
+        [REPO_DIR] + ([os.environ['PYTHONPATH']] if os.environ.get('PYTHONPATH') else [])))
+
+    try:
+        for step in steps:
+            fingerprint = step_fingerprint(step, cache, data_dir)
+            outputs = cache.lookup(fingerprint) if step.name not in force else None
+            if outputs is not None:
+                stale = stale_outputs(step, outputs, data_dir)
+                up_to_date = not stale and all(sha is None or cache.file_hash(os.path.join(data_dir, name)) == sha
+                                               for name, sha in outputs.items())
+                for path in stale:
+                    os.remove(path)
+                    if not os.listdir(os.path.dirname(path)):
+                        os.rmdir(os.path.dirname(path))
+                cache.restore(outputs, data_dir)
+                print(f"[{step.name}] {'up to date' if up_to_date else 'restored from cache'}")
+                continue
+
+            start = time.perf_counter()
+            subprocess.run([sys.executable, os.path.join(REPO_DIR, step.script)] + step.args,
+                           cwd=data_dir, env=env, check=True, stdout=subprocess.DEVNULL)
+            print(f"[{step.name}] ran {step.script} in {time.perf_counter() - start:.1f}s")
+            cache.store(fingerprint, output_paths(step, data_dir))
+    finally:
+        cache.save_hash_index()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run Step01 -> Step02 -> Step03, skipping steps whose inputs, '
+                                                 'code and arguments have not changed.')
+    parser.add_argument('--data-dir', default='.', help='Directory holding BRFSS_data.csv and the step outputs')
+    parser.add_argument('--cache-dir', default='.pipeline_cache', help='Artifact cache, relative to --data-dir')
+    parser.add_argument('--max-cache-mb', type=float, default=1024, help='Evict old artifacts beyond this size')
+    parser.add_argument('--only', nargs='+', default=None, help='Run only these steps (by name)')
+    parser.add_argument('--force', nargs='+', default=[], help='Rerun these steps even if they are cached')
+    parser.add_argument('--clean-args', nargs=argparse.REMAINDER, default=[],
+                        help='Arguments passed to Step01_data_clean.py, e.g. --chunksize 500000')
+    args = parser.parse_args()
+
+    steps = [step._replace(args=args.clean_args) if step.name == 'clean' else step for step in STEPS]
+    if args.only:
+        steps = [step for step in steps if step.name in args.only]
+    run_pipeline(steps, args.data_dir, args.cache_dir, int(args.max_cache_mb * (1 << 20)), args.force)
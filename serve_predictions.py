@@ -0,0 +1,114 @@
+import argparse
+import json
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from brfss_predict import ALL_STATES, MODEL_DIR, ModelRegistry
+
+
+class PredictionHandler(BaseHTTPRequestHandler):
+    """JSON API over the exported interaction models.
+
+    GET  /predict?income=...&education=...[&state=..][&version=..]   one prediction
+    POST /predict  {"queries": [{"income": .., "education": .., "state": ..}, ...], "version": ..}
+    GET  /models[?version=..]   the latest (or given) version, its levels and states, and the cached versions
+    GET  /health
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def _send(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _answer(self, func):
+        """Send the result of `func`, or the error it raised with the matching status."""
+        try:
+            body = func()
+        except KeyError as error:
+            self._send(404, {'error': error.args[0] if error.args else 'not found'})
+        except ValueError as error:
+            self._send(400, {'error': str(error)})
+        except Exception:
+            # Any other failure is a bug: answer anyway, so the client is not left with a dropped connection
+            self.log_error('%s', traceback.format_exc())
+            self._send(500, {'error': 'Internal server error'})
+        else:
+            self._send(200, body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        registry = self.server.registry
+        if url.path == '/predict':
+            self._answer(lambda: self._predict_one(registry, query))
+        elif url.path == '/models':
+            self._answer(lambda: dict(registry.get(query.get('version')).describe(),
+                                      versions=registry.versions(), cached=registry.cached_versions()))
+        elif url.path == '/health':
+            self._send(200, {'status': 'ok'})
+        else:
+            self._send(404, {'error': f'Unknown path {url.path}'})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/predict':
+            self._send(404, {'error': f'Unknown path {url.path}'})
+            return
+        self._answer(lambda: self._predict_batch(self.server.registry, self._read_body()))
+
+    def _read_body(self):
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            raise ValueError('Invalid Content-Length header') from None
+        return self.rfile.read(length)
+
+    @staticmethod
+    def _predict_one(registry, query):
+        if 'income' not in query or 'education' not in query:
+            raise ValueError("Query parameters 'income' and 'education' are required")
+        model = registry.get(query.get('version'))
+        return {'version': model.version,
+                'prediction': model.predict(query['income'], query['education'], query.get('state', ALL_STATES))}
+
+    @staticmethod
+    def _predict_batch(registry, body):
+        try:
+            request = json.loads(body)
+        except json.JSONDecodeError as error:
+            raise ValueError(f'Invalid JSON body: {error}') from None
+        if not isinstance(request, dict) or not isinstance(request.get('queries'), list):
+            raise ValueError("The body must be an object with a 'queries' list")
+        model = registry.get(request.get('version'))
+        return {'version': model.version, 'predictions': model.predict_queries(request['queries']).tolist()}
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve predicted obesity rates from the exported interaction models.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--model-dir', default=MODEL_DIR)
+    parser.add_argument('--cache-size', type=int, default=4, help='Model versions kept in memory')
+    parser.add_argument('--verbose', action='store_true', help='Log every request')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), PredictionHandler)
+    server.registry = ModelRegistry(args.model_dir, max_versions=args.cache_size)
+    server.verbose = args.verbose
+    print(f"Serving predictions from {args.model_dir} on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()